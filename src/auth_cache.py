@@ -0,0 +1,142 @@
+# src/auth_cache.py
+# Cache en mémoire des tokens JWT déjà validés : token -> identité de l'utilisateur.
+# Sans lui, chaque requête authentifiée refait une requête SQL (recherche par email).
+# Les entrées expirent après un TTL (et au plus tard à l'expiration du token) et sont
+# invalidées quand l'utilisateur change de mot de passe ou d'email, ou est supprimé
+# (événements SQLAlchemy).
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from auth_database import User
+from models import AuthenticatedUser
+
+# Clé de session où sont notés les utilisateurs modifiés, invalidés à nouveau après le commit
+PENDING_INVALIDATIONS_KEY = "auth_cache_invalidate"
+
+
+def password_fingerprint(hashed_password: str) -> str:
+    """Empreinte courte du hash du mot de passe, placée dans le JWT : un changement de mot de passe révoque les anciens tokens."""
+    return hashlib.sha256(hashed_password.encode("utf-8")).hexdigest()[:12]
+
+
+class AuthCache:
+    """Cache LRU + TTL des identités associées aux tokens validés."""
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # empreinte du token -> (utilisateur, instant d'expiration)
+        self._entries: "OrderedDict[str, Tuple[AuthenticatedUser, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Les tokens eux-mêmes ne sont pas conservés en mémoire
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _remove(self, key: str):
+        user, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.id]
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        """Retourne l'utilisateur associé au token s'il est en cache et non expiré."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user: AuthenticatedUser, token_expires_at: Optional[float] = None):
+        """Enregistre un token validé (expire après le TTL, ou à l'expiration du token si elle est plus proche)."""
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (user, expires_at)
+            self._keys_by_user.setdefault(user.id, set()).add(key)
+
+    def invalidate_user(self, user_id: int):
+        """Retire toutes les entrées d'un utilisateur (mot de passe changé, compte supprimé...)."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict:
+        """Taux de succès (requêtes SQL d'authentification évitées)."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else None,
+            "invalidations": self.invalidations,
+        }
+
+
+def register_invalidation_listeners(cache: AuthCache):
+    """
+    Invalide le cache quand un utilisateur est modifié (mot de passe, email) ou supprimé via l'ORM.
+    L'invalidation est faite au flush, puis à nouveau après le commit : une requête concurrente
+    ne peut pas remettre en cache l'ancien état entre les deux.
+    Les suppressions en masse (query.delete()) ne déclenchent pas ces événements.
+    """
+
+    def mark(target: User):
+        cache.invalidate_user(target.id)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).add(target.id)
+
+    @event.listens_for(User, "after_update")
+    def on_user_updated(mapper, connection, target):
+        state = inspect(target)
+        if state.attrs.hashed_password.history.has_changes() or state.attrs.email.history.has_changes():
+            mark(target)
+
+    @event.listens_for(User, "after_delete")
+    def on_user_deleted(mapper, connection, target):
+        mark(target)
+
+    @event.listens_for(Session, "after_commit")
+    def on_commit(session):
+        for user_id in session.info.pop(PENDING_INVALIDATIONS_KEY, ()):
+            cache.invalidate_user(user_id)
+
+    @event.listens_for(Session, "after_rollback")
+    def on_rollback(session):
+        session.info.pop(PENDING_INVALIDATIONS_KEY, None)
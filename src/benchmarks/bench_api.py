@@ -0,0 +1,301 @@
+# src/benchmarks/bench_api.py
+# Benchmark de bout en bout de l'API sans appeler Google : les modèles Gemini sont remplacés
+# par des modèles locaux déterministes à latence configurable, Postgres par SQLite (ou une
+# base locale via --database-url). Mesure l'indexation (chunks/s) puis /query et
+# /program/generate avec des clients concurrents (p50/p95/p99, requêtes/s).
+# Les résultats sont écrits dans un fichier JSON ; --compare signale les régressions.
+#
+# Exemple (depuis src/) :
+#   python benchmarks/bench_api.py --requests 200 --concurrency 16 --output benchmarks/baseline.json
+#   python benchmarks/bench_api.py --compare benchmarks/baseline.json
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# --- 1. Modèles locaux ---
+
+class FakeLatencyEmbeddings(Embeddings):
+    """Embeddings déterministes (dérivés du hash du texte) avec une latence fixe par appel."""
+
+    def __init__(self, size: int = 768, latency: float = 0.05):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+        return np.random.default_rng(seed).standard_normal(self.size).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeLatencyChatModel(BaseChatModel):
+    """Modèle de chat local : répond un texte fixe après un délai (premier token) puis un délai par token."""
+
+    response: str = "CONCISE ANSWER: Réponse de test. DETAILED EXPLANATION: " + "entraînement progressif " * 40
+    first_token_latency: float = 0.3
+    token_latency: float = 0.005
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def _tokens(self) -> List[str]:
+        return [word + " " for word in self.response.split()]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# --- 2. Mesures ---
+
+QUERIES = [
+    "Quelle allure pour un premier 10 km ?",
+    "Combien de protéines après une séance de fractionné ?",
+    "Comment éviter les blessures en débutant la course à pied ?",
+    "Que manger avant un semi-marathon ?",
+    "Combien de séances par semaine pour progresser ?",
+    "Quelle hydratation pendant une sortie longue ?",
+    "Comment choisir ses chaussures de running ?",
+    "Quels glucides privilégier la veille d'une course ?",
+]
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict:
+    samples = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "requests_per_second": len(latencies) / seconds if seconds else None,
+        "p50_ms": float(np.percentile(samples, 50)) if len(samples) else None,
+        "p95_ms": float(np.percentile(samples, 95)) if len(samples) else None,
+        "p99_ms": float(np.percentile(samples, 99)) if len(samples) else None,
+    }
+
+async def drive(client, method: str, url: str, n_requests: int, concurrency: int, build_kwargs) -> Dict:
+    """Envoie n_requests requêtes avec concurrency clients simultanés."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            response = await client.request(method, url, **build_kwargs(index))
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# --- 3. Scénarios ---
+
+def setup_environment(args, workdir: str):
+    """Variables d'environnement lues par config.py / auth_database.py (avant d'importer main)."""
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "true" if args.semantic_cache else "false"
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+    os.environ["INGEST_CACHE_PATH"] = os.path.join(workdir, "ingest_cache")
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+
+def bench_ingestion(main, args, workdir: str) -> Dict:
+    """Indexation complète du dossier docs avec les embeddings locaux."""
+    from embedding_cache import CachedEmbeddings
+
+    docs_path = os.path.join(workdir, "docs")
+    shutil.copytree(args.docs, docs_path)
+    main.DOCS_PATH = docs_path
+    main.CHROMA_DB_PATH = os.path.join(workdir, "index")
+    main.EMBEDDINGS = CachedEmbeddings(
+        FakeLatencyEmbeddings(size=args.embedding_dim, latency=args.embedding_latency),
+        model_name="fake-latency",
+        cache_path=os.path.join(workdir, "embedding_cache.sqlite3"),
+        max_entries=1_000_000
+    )
+    main.CHAT_MODEL = FakeLatencyChatModel(first_token_latency=args.llm_latency, token_latency=args.token_latency)
+
+    started = time.perf_counter()
+    stats = main.initialize_or_update_retriever()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": seconds,
+        "chunks": stats["chunks_added"],
+        "chunks_per_second": stats["chunks_added"] / seconds if seconds else None,
+        "embedding_seconds": stats["embedding"]["seconds"],
+        "rss_increase_mb": stats["ingestion"]["rss_increase_mb"],
+        "process_peak_rss_mb": stats["ingestion"]["process_peak_rss_mb"],
+    }
+
+async def bench_api(main, args) -> Dict:
+    import httpx
+
+    await main.create_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120, limits=limits) as client:
+        response = await client.post("/register", json={"email": f"bench-{time.time_ns()}@example.com", "password": "benchmark"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        await client.post("/user/parameters", headers=headers, json={
+            "age": 30, "sport_goal": "10km", "activity_level": "Intermédiaire",
+            "time_per_week_hours": 4, "equipment_available": "Aucun"
+        })
+
+        results = {}
+        results["query"] = await drive(
+            client, "POST", "/query", args.requests, args.concurrency,
+            lambda i: {"headers": headers, "json": {"query": f"{QUERIES[i % len(QUERIES)]} ({i})"}}
+        )
+        results["query_stream"] = await drive(
+            client, "POST", "/query/stream", args.requests, args.concurrency,
+            lambda i: {"headers": headers, "json": {"query": f"{QUERIES[i % len(QUERIES)]} ({i})"}}
+        )
+        # regenerate=true : mesure la génération et non les programmes mémorisés
+        results["program_generate"] = await drive(
+            client, "POST", "/program/generate?regenerate=true", max(1, args.requests // 4), args.concurrency,
+            lambda i: {"headers": headers}
+        )
+        results["program_generate_cached"] = await drive(
+            client, "POST", "/program/generate", args.requests, args.concurrency,
+            lambda i: {"headers": headers}
+        )
+    return results
+
+
+# --- 4. Comparaison avec une référence ---
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Régressions (p95 plus lent ou débit plus faible de plus de tolerance) par rapport à la référence."""
+    regressions = []
+    for name, result in current["api"].items():
+        reference = baseline.get("api", {}).get(name)
+        if not reference or result["p95_ms"] is None or reference["p95_ms"] is None:
+            continue
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {reference['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result["requests_per_second"] < reference["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: {reference['requests_per_second']:.1f} -> {result['requests_per_second']:.1f} req/s")
+    reference = baseline.get("ingestion", {}).get("chunks_per_second")
+    if reference and current["ingestion"]["chunks_per_second"] < reference * (1 - tolerance):
+        regressions.append(f"ingestion: {reference:.0f} -> {current['ingestion']['chunks_per_second']:.0f} chunks/s")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark de l'API RAG avec des modèles locaux")
+    parser.add_argument("--docs", default=os.path.join(SRC_DIR, "docs"), help="Dossier de PDF à indexer")
+    parser.add_argument("--requests", type=int, default=100, help="Requêtes par scénario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Latence par appel d'embedding (s)")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latence avant le premier token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Latence par token (s)")
+    parser.add_argument("--vector-backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--semantic-cache", action="store_true", help="Active le cache sémantique de /query")
+    parser.add_argument("--database-url", default=None, help="URL SQLAlchemy async (défaut : SQLite temporaire)")
+    parser.add_argument("--output", default=None, help="Fichier JSON où écrire les résultats")
+    parser.add_argument("--compare", default=None, help="Fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Régression tolérée (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_api_")
+    setup_environment(args, workdir)
+    os.chdir(SRC_DIR)
+    import main
+
+    try:
+        ingestion = bench_ingestion(main, args, workdir)
+        api = asyncio.run(bench_api(main, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "docs")},
+        "ingestion": ingestion,
+        "api": api,
+    }
+
+    peak = ""
+    if ingestion["rss_increase_mb"] is not None:
+        peak += f", mémoire +{ingestion['rss_increase_mb']:.0f} Mo pendant l'indexation"
+    if ingestion["process_peak_rss_mb"] is not None:
+        peak += f", pic du processus {ingestion['process_peak_rss_mb']:.0f} Mo"
+    print(f"\nIndexation : {ingestion['chunks']} chunks en {ingestion['seconds']:.1f}s ({ingestion['chunks_per_second']:.0f} chunks/s{peak})")
+    print(f"{'scénario':<26} {'req':>5} {'err':>4} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for name, result in api.items():
+        print(f"{name:<26} {result['requests']:>5} {result['errors']:>4} {result['requests_per_second']:>8.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRÉGRESSIONS :")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\nAucune régression par rapport à {args.compare} (tolérance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main_cli()
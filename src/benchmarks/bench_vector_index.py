@@ -0,0 +1,133 @@
+# src/benchmarks/bench_vector_index.py
+# Compare la latence de recherche top-k de l'index NumPy (vector_index.py) et de Chroma
+# sur des vecteurs aléatoires (768 dimensions, comme text-embedding-004).
+#
+# Exemple (depuis src/) :
+#   python benchmarks/bench_vector_index.py --sizes 10000,100000,1000000
+# (Chroma est mesuré à toutes les tailles ; --chroma-max-size 100000 évite son insertion
+# de 1M de chunks, très longue : la ligne est alors marquée "ignoré" dans le rapport.)
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_index import NumpyVectorStore
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+def bench_numpy(vectors, queries, k, batch_size):
+    # Les vecteurs sont fournis directement (upsert_embeddings, recherche par vecteurs) :
+    # le modèle factice n'est jamais appelé, il ne sert qu'à construire le store
+    embeddings = DeterministicFakeEmbedding(size=vectors.shape[1])
+    with tempfile.TemporaryDirectory(prefix="bench_numpy_") as directory:
+        return _bench_numpy(directory, embeddings, vectors, queries, k, batch_size)
+
+def _bench_numpy(directory, embeddings, vectors, queries, k, batch_size):
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    texts = [f"texte {i}" for i in range(len(vectors))]
+    metadatas = [{"source": "bench.pdf", "page": i % 100} for i in range(len(vectors))]
+
+    started = time.perf_counter()
+    store = NumpyVectorStore(embedding_function=embeddings, persist_directory=directory)
+    store.upsert_embeddings(ids, texts, metadatas, vectors)
+    store.save()
+    build_seconds = time.perf_counter() - started
+
+    # Rechargement depuis le disque (matrice mappée en mémoire), comme au démarrage de l'API
+    store = NumpyVectorStore(embedding_function=embeddings, persist_directory=directory)
+    store.similarity_search_by_vectors(queries[:1], k=k) # échauffement
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        store.similarity_search_by_vectors([query], k=k)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        store.similarity_search_by_vectors(queries[start:start + batch_size], k=k)
+    batched_seconds = time.perf_counter() - started
+
+    return {
+        "build_s": build_seconds,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "batched_ms_per_query": batched_seconds / len(queries) * 1000,
+    }
+
+def bench_chroma(vectors, queries, k):
+    import chromadb
+
+    with tempfile.TemporaryDirectory(prefix="bench_chroma_", ignore_cleanup_errors=True) as directory: # Chroma garde ses fichiers ouverts (Windows)
+        return _bench_chroma(chromadb.PersistentClient(path=directory), vectors, queries, k)
+
+def _bench_chroma(client, vectors, queries, k):
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+
+    started = time.perf_counter()
+    batch = 5000
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        collection.add(
+            ids=[f"chunk-{i}" for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"texte {i}" for i in range(start, end)],
+            metadatas=[{"source": "bench.pdf", "page": i % 100} for i in range(start, end)],
+        )
+    build_seconds = time.perf_counter() - started
+
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=k) # échauffement
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=k, include=["documents", "metadatas", "distances"])
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "build_s": build_seconds,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "batched_ms_per_query": None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index NumPy vs Chroma")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Nombres de chunks, séparés par des virgules")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32, help="Taille des lots de requêtes (NumPy)")
+    parser.add_argument("--chroma-max-size", type=int, default=None,
+                        help="Taille au-delà de laquelle Chroma n'est pas mesuré (insertion très longue) ; par défaut aucune")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'backend':<8} {'chunks':>9} {'build (s)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'lot (ms/req)':>13}")
+    for size in [int(value) for value in args.sizes.split(",")]:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        backends = [("numpy", lambda: bench_numpy(vectors, queries, args.k, args.batch_size))]
+        if args.chroma_max_size is None or size <= args.chroma_max_size:
+            backends.append(("chroma", lambda: bench_chroma(vectors, queries, args.k)))
+
+        for name, run in backends:
+            result = run()
+            batched = f"{result['batched_ms_per_query']:.3f}" if result["batched_ms_per_query"] is not None else "-"
+            print(f"{name:<8} {size:>9} {result['build_s']:>10.1f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {batched:>13}")
+        if len(backends) == 1:
+            print(f"{'chroma':<8} {size:>9} ignoré (> --chroma-max-size {args.chroma_max_size} ; relancer sans cette option pour le mesurer)")
+
+
+if __name__ == "__main__":
+    main()
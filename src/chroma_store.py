@@ -0,0 +1,38 @@
+# src/chroma_store.py
+# Chroma (langchain_community) avec deux ajouts utilisés par la recherche :
+#  - les Documents renvoyés portent l'id du chunk (Document.id), comme ceux de l'index NumPy ;
+#  - get_vectors(ids) relit les embeddings enregistrés, pour que la sélection MMR n'ait pas
+#    à ré-embedder les candidats.
+# Importé à la première ouverture d'une base Chroma (voir main.open_vectorstore).
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+
+class ChromaStore(Chroma):
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, str]] = None,
+                                     where_document: Optional[Dict[str, str]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        results = self._collection.query(
+            query_embeddings=[self._embedding_function.embed_query(query)],
+            n_results=k,
+            where=filter,
+            where_document=where_document,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            (Document(page_content=text, metadata=metadata or {}, id=chunk_id), distance)
+            for chunk_id, text, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+    def get_vectors(self, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Embeddings enregistrés des chunks demandés (les ids inconnus sont absents du résultat)."""
+        if not ids:
+            return {}
+        result = self._collection.get(ids=list(ids), include=["embeddings"])
+        return {chunk_id: np.asarray(vector, dtype=np.float32) for chunk_id, vector in zip(result["ids"], result["embeddings"])}
@@ -0,0 +1,144 @@
+# src/chunk_dedup.py
+# Élimination des chunks quasi identiques avant l'embedding (MinHash + LSH).
+# Les PDF répètent en-têtes, pieds de page, avertissements et tableaux d'une page à l'autre :
+# chaque répétition deviendrait un chunk embeddé de plus, en concurrence avec les autres
+# lors de la recherche. Un chunk dont la similarité de Jaccard estimée (shingles de mots)
+# avec un chunk déjà indexé dépasse le seuil n'est pas embeddé : il est rattaché à ce
+# représentant, qui garde la liste de ses autres sources.
+
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+MINHASH_FILENAME = "minhash.npz"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Hachage universel (a * x + b) mod p : p premier > 2^32 et a < 2^31, sans débordement en uint64
+_PRIME = np.uint64(4294967311)
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """Empreintes (crc32) des séquences de size mots consécutifs du texte normalisé."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Signatures MinHash de num_perm permutations (déterministes : seed fixe)."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        generator = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = generator.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        values = np.fromiter(shingles(text), dtype=np.uint64)
+        # (shingles, permutations) -> minimum par permutation
+        hashed = (values[:, None] * self._a + self._b) % _PRIME
+        return hashed.min(axis=0)
+
+
+def estimated_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+class NearDuplicateIndex:
+    """
+    Index LSH (bands x rows = num_perm) des signatures des chunks embeddés.
+    find() ne renvoie un représentant que si la similarité estimée atteint threshold.
+    """
+
+    def __init__(self, hasher: MinHasher, bands: int = 16, threshold: float = 0.85):
+        if hasher.num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.hasher = hasher
+        self.bands = bands
+        self.rows = hasher.num_perm // bands
+        self.threshold = threshold
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, chunk_id: str, signature: np.ndarray):
+        self._signatures[chunk_id] = signature
+        for key in self._keys(signature):
+            self._buckets.setdefault(key, set()).add(chunk_id)
+
+    def delete(self, chunk_ids: Sequence[str]):
+        for chunk_id in chunk_ids:
+            signature = self._signatures.pop(chunk_id, None)
+            if signature is None:
+                continue
+            for key in self._keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(chunk_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def retain(self, chunk_ids: Set[str]):
+        """Ne garde que les signatures des chunks donnés (ex: présents d'après le manifeste)."""
+        self.delete([chunk_id for chunk_id in list(self._signatures) if chunk_id not in chunk_ids])
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """Chunk indexé le plus proche au-delà du seuil, ou None."""
+        candidates = set()
+        for key in self._keys(signature):
+            candidates |= self._buckets.get(key, set())
+        best, best_similarity = None, self.threshold
+        for chunk_id in sorted(candidates):
+            similarity = estimated_jaccard(signature, self._signatures[chunk_id])
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    # --- Persistance (à côté de la version de l'index) ---
+
+    def save(self, directory: str):
+        ids = list(self._signatures)
+        matrix = np.stack([self._signatures[chunk_id] for chunk_id in ids]) if ids else np.zeros((0, self.hasher.num_perm), dtype=np.uint64)
+        path = os.path.join(directory, MINHASH_FILENAME)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, ids=np.asarray(ids, dtype=str), signatures=matrix)
+        os.replace(path + ".tmp", path)
+
+    def load(self, directory: str) -> bool:
+        """Recharge les signatures enregistrées ; False si absentes ou calculées avec d'autres paramètres."""
+        path = os.path.join(directory, MINHASH_FILENAME)
+        if not os.path.exists(path):
+            return False
+        arrays = np.load(path)
+        if arrays["signatures"].shape[1] != self.hasher.num_perm:
+            return False
+        for chunk_id, signature in zip(arrays["ids"].tolist(), arrays["signatures"]):
+            self.add(chunk_id, signature)
+        return True
+
+
+# --- Références des chunks écartés (manifeste) ---
+
+def stored_chunk_ids(entry: Dict) -> List[str]:
+    """Chunks d'une entrée du manifeste réellement présents dans la base (hors doublons écartés)."""
+    duplicates = entry.get("duplicates", {})
+    return [chunk_id for chunk_id in entry.get("chunk_ids", []) if chunk_id not in duplicates]
+
+def duplicate_references(files: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Représentant -> autres sources ("fichier.pdf p. N") des chunks qui lui ont été rattachés."""
+    references: Dict[str, List[str]] = {}
+    for filename, entry in sorted(files.items()):
+        for representative, page in entry.get("duplicates", {}).values():
+            references.setdefault(representative, []).append(f"{filename} p. {page}")
+    return references
@@ -0,0 +1,223 @@
+# src/context_selection.py
+# Post-traitement des résultats de recherche avant leur envoi au LLM.
+# Les chunks se chevauchent de 20 % : les k premiers résultats contiennent souvent deux
+# morceaux voisins presque identiques. On récupère donc plus de candidats, on en choisit k
+# par Maximal Marginal Relevance (vectorisé avec NumPy), on écarte les quasi-doublons et on
+# fusionne les chunks adjacents d'une même page. Le contexte envoyé au LLM est enfin rendu
+# sous une forme compacte et limité à un budget de tokens (phrases classées par pertinence).
+
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+
+from lexical_index import tokenize
+
+
+# --- 1. Sélection MMR ---
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, k: int, lambda_mult: float = 0.7,
+               duplicate_threshold: float = 0.95) -> List[int]:
+    """
+    Sélectionne k indices maximisant lambda * pertinence - (1 - lambda) * similarité au déjà choisi.
+    Un candidat dont la similarité cosinus avec un chunk choisi dépasse duplicate_threshold est écarté.
+    """
+    if len(vectors) == 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    normalized = vectors / norms
+    similarities = normalized @ normalized.T # (n, n), calculée une seule fois
+
+    selected: List[int] = []
+    available = np.ones(len(vectors), dtype=bool)
+    max_similarity = np.zeros(len(vectors), dtype=np.float32) # au plus proche des chunks choisis
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarities[best])
+        available &= max_similarity < duplicate_threshold
+    return selected
+
+
+# --- 2. Fusion des chunks adjacents ---
+
+def merge_overlapping_text(first: str, second: str, min_overlap: int = 30) -> Optional[str]:
+    """Si second commence par la fin de first (chevauchement du découpage), retourne le texte fusionné."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    head = second[:min_overlap]
+    if len(head) < min_overlap:
+        return None
+    position = first.find(head)
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first + second[len(first) - position:]
+        position = first.find(head, position + 1)
+    return None
+
+def merge_adjacent_chunks(documents: List[Document]) -> List[Document]:
+    """Fusionne les chunks d'une même page dont les textes se chevauchent (l'ordre du premier est conservé)."""
+    merged: List[Document] = []
+    for document in documents:
+        for index, kept in enumerate(merged):
+            if (kept.metadata.get("source"), kept.metadata.get("page")) != (document.metadata.get("source"), document.metadata.get("page")):
+                continue
+            text = merge_overlapping_text(kept.page_content, document.page_content) \
+                or merge_overlapping_text(document.page_content, kept.page_content)
+            if text is not None:
+                merged[index] = Document(page_content=text, metadata=dict(kept.metadata))
+                break
+        else:
+            merged.append(document)
+    return merged
+
+
+# --- 3. Retriever ---
+
+class DiversifiedRetriever(BaseRetriever):
+    """
+    Enveloppe un retriever (vectoriel ou hybride) qui renvoie fetch_k candidats classés,
+    et n'en garde que k, diversifiés par MMR puis fusionnés.
+    La pertinence utilisée par MMR est celle du classement amont ; les embeddings des
+    candidats sont relus dans la base vectorielle (vectorstore.get_vectors, par Document.id),
+    sans appel au modèle. Seul un candidat sans id connu passe par embeddings (et son cache).
+    """
+
+    base_retriever: BaseRetriever
+    embeddings: Any
+    vectorstore: Any = None
+    k: int = 3
+    lambda_mult: float = 0.7
+    duplicate_threshold: float = 0.95
+
+    def _select(self, candidates: List[Document], vectors: List[List[float]]) -> List[Document]:
+        relevance = 1.0 - np.arange(len(candidates), dtype=np.float32) / len(candidates)
+        selected = mmr_select(
+            np.asarray(vectors, dtype=np.float32), relevance, self.k,
+            lambda_mult=self.lambda_mult, duplicate_threshold=self.duplicate_threshold
+        )
+        return merge_adjacent_chunks([candidates[index] for index in selected])
+
+    def _stored_vectors(self, candidates: List[Document]) -> List[Optional[np.ndarray]]:
+        """Vecteurs enregistrés des candidats (None pour ceux qui n'ont pas d'id connu de la base)."""
+        ids = [document.id for document in candidates if document.id is not None]
+        stored = self.vectorstore.get_vectors(ids) if self.vectorstore is not None and ids else {}
+        return [stored.get(document.id) for document in candidates]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.base_retriever.invoke(query)
+        if len(candidates) <= 1:
+            return candidates
+        vectors = self._stored_vectors(candidates)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for index, vector in zip(missing, self.embeddings.embed_documents([candidates[index].page_content for index in missing])):
+                vectors[index] = vector
+        return self._select(candidates, vectors)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = await self.base_retriever.ainvoke(query)
+        if len(candidates) <= 1:
+            return candidates
+        vectors = await run_in_executor(None, self._stored_vectors, candidates)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for index, vector in zip(missing, await self.embeddings.aembed_documents([candidates[index].page_content for index in missing])):
+                vectors[index] = vector
+        return self._select(candidates, vectors)
+
+
+# --- 4. Construction du contexte sous budget de tokens ---
+
+# Estimation sans tokenizer local (≈ 4 caractères par token pour Gemini sur du français)
+CHARS_PER_TOKEN = 4
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+|\n{2,}")
+
+def estimate_tokens(text: str) -> int:
+    """Nombre approximatif de tokens d'un texte."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def source_tag(document: Document) -> str:
+    """Référence compacte d'un chunk : [fichier.pdf, p. N]."""
+    name = os.path.basename(document.metadata.get("source", "")) or "document"
+    page = document.metadata.get("page")
+    return f"[{name}, p. {page}]" if page is not None else f"[{name}]"
+
+def split_sentences(text: str) -> List[str]:
+    """Découpe un chunk en phrases (ou paragraphes)."""
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_RE.split(text) if sentence.strip()]
+
+def pack_context(query: str, documents: List[Document], max_tokens: int) -> Tuple[str, Dict]:
+    """
+    Rend les chunks sous la forme "[source, p. N]\\ntexte" dans la limite de max_tokens.
+    Si tout ne tient pas, les phrases sont classées par recouvrement (pondéré par l'IDF) avec
+    la question, puis par rang du chunk, et seules les meilleures sont gardées, dans leur ordre d'origine.
+    Retourne le contexte et {tokens, chunks, sentences_kept, sentences_total, truncated}.
+    """
+    blocks = [(source_tag(document), document.page_content.strip()) for document in documents]
+    full = "\n\n".join(f"{tag}\n{text}" for tag, text in blocks)
+    full_tokens = estimate_tokens(full)
+    if full_tokens <= max_tokens:
+        return full, {"tokens": full_tokens, "chunks": len(blocks), "sentences_kept": None, "sentences_total": None, "truncated": False}
+
+    # Phrases candidates : (chunk, position, texte, termes)
+    sentences = [
+        (block_index, position, sentence, set(tokenize(sentence)))
+        for block_index, (_, text) in enumerate(blocks)
+        for position, sentence in enumerate(split_sentences(text))
+    ]
+    query_terms = set(tokenize(query))
+    document_frequency = {term: sum(term in terms for *_, terms in sentences) for term in query_terms}
+    scores = np.array([
+        sum(math.log(1 + len(sentences) / document_frequency[term]) for term in query_terms & terms)
+        + 0.1 * (1 - block_index / len(blocks))
+        for block_index, _, _, terms in sentences
+    ])
+
+    kept = set()
+    used_tokens = 0
+    tagged_blocks = set()
+    for index in np.argsort(-scores, kind="stable"):
+        block_index, _, sentence, _ = sentences[index]
+        cost = estimate_tokens(sentence) + 1
+        if block_index not in tagged_blocks:
+            cost += estimate_tokens(blocks[block_index][0]) + 1
+        if used_tokens + cost > max_tokens:
+            continue
+        kept.add(int(index))
+        tagged_blocks.add(block_index)
+        used_tokens += cost
+
+    # Rendu dans l'ordre d'origine ; "…" marque les passages retirés
+    parts = []
+    for block_index, (tag, _) in enumerate(blocks):
+        block_sentences = [(position, sentence) for i, (b, position, sentence, _) in enumerate(sentences) if b == block_index and i in kept]
+        if not block_sentences:
+            continue
+        text, previous = "", -1
+        for position, sentence in block_sentences:
+            separator = "" if previous == -1 else (" " if position == previous + 1 else " … ")
+            text += separator + sentence
+            previous = position
+        parts.append(f"{tag}\n{text}")
+    context = "\n\n".join(parts)
+    return context, {
+        "tokens": estimate_tokens(context),
+        "chunks": len(parts),
+        "sentences_kept": len(kept),
+        "sentences_total": len(sentences),
+        "truncated": True,
+    }
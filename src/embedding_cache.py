@@ -0,0 +1,179 @@
+# src/embedding_cache.py
+# Cache persistant des embeddings (SQLite), placé devant le modèle d'embedding.
+# La clé est (nom du modèle, SHA-256 du texte) : un même chunk ou une même question
+# n'est jamais envoyé deux fois à l'API, même après un redémarrage ou une ré-indexation.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import record_cache
+
+
+def text_sha256(text: str) -> str:
+    """Empreinte SHA-256 d'un texte (clé de cache)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embedding LangChain avec un cache SQLite borné (éviction LRU).
+    Les vecteurs sont stockés en float32 sous forme de blob.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_path: str, max_entries: int = 200_000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(directory, exist_ok=True)
+        # Une seule connexion partagée entre les threads, protégée par le verrou
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Nombre de lignes tenu à jour en mémoire : COUNT(*) parcourt toute la table, il n'est
+        # relancé que lorsque l'estimation dépasse max_entries. Les autres workers écrivent aussi
+        # dans le fichier : le compte exact est alors relu avant d'évincer.
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # --- Accès au cache ---
+
+    def _lookup(self, model_key: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Retourne les vecteurs présents en cache et rafraîchit leur date d'utilisation."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limite le nombre de paramètres par requête : on procède par paquets
+            unique_hashes = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model_key, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model_key, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, model_key: str, items: Dict[str, List[float]]):
+        """Enregistre de nouveaux vecteurs puis applique l'éviction LRU si nécessaire."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            # Un texte déjà présent (calculé en parallèle par un autre thread ou worker) a le même vecteur
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (model_key, text_hash, array("f", vector).tobytes(), now)
+                    for text_hash, vector in items.items()
+                ],
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if self._count > self.max_entries:
+                # On évince 5 % de marge en plus : le prochain comptage n'aura lieu qu'après autant d'ajouts
+                overflow = self._count - self.max_entries + self.max_entries // 20
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+                self._count -= overflow
+            self._conn.commit()
+
+    # --- Interface Embeddings ---
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_sha256(text) for text in texts]
+        cached = self._lookup(self.model_name, hashes)
+
+        # Textes absents du cache (dédoublonnés pour ne payer qu'une fois)
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        record_cache("embedding", True, len(texts) - len(missing))
+        record_cache("embedding", False, len(missing))
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(self.model_name, computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Les embeddings de requête utilisent un autre type de tâche que ceux des documents :
+        # ils sont rangés sous une clé de modèle distincte
+        model_key = f"{self.model_name}#query"
+        text_hash = text_sha256(text)
+        cached = self._lookup(model_key, [text_hash])
+        record_cache("embedding_query", text_hash in cached)
+        with self._lock:
+            if text_hash in cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if text_hash in cached:
+            return cached[text_hash]
+
+        vector = self.embeddings.embed_query(text)
+        self._store(model_key, {text_hash: vector})
+        return vector
+
+    # --- Statistiques ---
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Compteurs du cache (hits, misses, taux de succès, évictions, taille)."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else None,
+            "evictions": evictions,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
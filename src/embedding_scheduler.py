@@ -0,0 +1,160 @@
+# src/embedding_scheduler.py
+# Ordonnanceur des embeddings pour l'indexation : les chunks sont regroupés en lots,
+# plusieurs lots sont envoyés en parallèle sous un limiteur de débit (token bucket),
+# les lots refusés pour quota dépassé sont relancés avec un backoff exponentiel,
+# et chaque lot terminé est écrit immédiatement dans la collection.
+# Les chunks peuvent arriver d'un générateur (run_stream) : le nombre de lots en
+# attente est borné, ce qui borne la mémoire quelle que soit la taille du corpus.
+
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class TokenBucket:
+    """Limiteur de débit thread-safe : 'rate' jetons par seconde, au plus 'capacity' en réserve."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Bloque jusqu'à ce que 'tokens' jetons soient disponibles, puis les consomme."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Détecte une erreur de quota/débit renvoyée par le fournisseur (HTTP 429, RESOURCE_EXHAUSTED...)."""
+    text = f"{error.__class__.__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "resource_exhausted", "resourceexhausted", "rate limit", "quota", "too many requests"))
+
+
+class EmbeddingScheduler:
+    """
+    Calcule les embeddings d'une liste de chunks par lots concurrents.
+    write_batch(ids, texts, metadatas, vectors) est appelé pour chaque lot terminé
+    (les écritures sont sérialisées).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 1500,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        max_pending_batches: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Lots lus en avance (en cours d'embedding ou en attente d'un thread)
+        self.max_pending_batches = max_pending_batches or 2 * max_concurrency
+        self._write_lock = threading.Lock()
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """Envoie un lot au modèle, en relançant avec backoff si le débit est dépassé."""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                delay *= 0.5 + random.random()  # jitter pour désynchroniser les lots
+                attempt += 1
+                print(f"   Quota d'embedding atteint, nouvelle tentative {attempt}/{self.max_retries} dans {delay:.1f}s.")
+                time.sleep(delay)
+
+    def run(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict],
+        write_batch: Callable[[List[str], List[str], List[Dict], List[List[float]]], None],
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Dict:
+        """
+        Embedde et écrit tous les chunks. Lève la première erreur définitive rencontrée
+        (les lots déjà écrits restent dans la collection).
+        progress(n) est appelé avec le nombre de chunks écrits par lot.
+        """
+        return self.run_stream(zip(ids, texts, metadatas), write_batch, progress=progress)
+
+    def run_stream(
+        self,
+        chunks: Iterable[Tuple[str, str, Dict]],
+        write_batch: Callable[[List[str], List[str], List[Dict], List[List[float]]], None],
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Dict:
+        """
+        Comme run, pour des chunks (id, texte, métadonnées) produits au fil de l'eau.
+        Le générateur n'est lu que lorsqu'un lot peut être mis en attente : au plus
+        max_pending_batches lots sont en mémoire à la fois.
+        """
+        chunks = iter(chunks)
+        started = time.perf_counter()
+        written = 0
+        batches = 0
+
+        def process(batch):
+            batch_ids, batch_texts, batch_metadatas = (list(column) for column in zip(*batch))
+            vectors = self._embed_with_retry(batch_texts)
+            with self._write_lock:
+                write_batch(batch_ids, batch_texts, batch_metadatas, vectors)
+            return len(batch_ids)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = set()
+            try:
+                while True:
+                    batch = list(islice(chunks, self.batch_size)) if len(pending) < self.max_pending_batches else None
+                    if batch:
+                        pending.add(executor.submit(process, batch))
+                        batches += 1
+                        continue
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        count = future.result()
+                        written += count
+                        if progress is not None:
+                            progress(count)
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        elapsed = time.perf_counter() - started
+        return {
+            "chunks": written,
+            "batches": batches,
+            "seconds": elapsed,
+            "chunks_per_second": (written / elapsed) if elapsed > 0 else None,
+        }
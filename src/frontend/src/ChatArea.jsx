@@ -2,6 +2,7 @@
 import React, { useState } from 'react';
 import './index.css';
 import { useAuth } from './AuthContext';
+import { readEventStream } from './sse';
 
 const ChatArea = () => {
     const [prompt, setPrompt] = useState('');
@@ -9,8 +10,8 @@ const ChatArea = () => {
     const [isLoading, setIsLoading] = useState(false);
     const { getAccessToken } = useAuth();
 
-    // L'URL de l'API est le backend FastAPI lancé sur le port 8000
-    const API_URL = "http://127.0.0.1:8000/query"; 
+    // L'URL de l'API est le backend FastAPI lancé sur le port 8000 (variante streaming SSE)
+    const API_URL = "http://127.0.0.1:8000/query/stream"; 
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -43,9 +44,29 @@ const ChatArea = () => {
                 throw new Error(`Erreur de l'API (${res.status}): ${res.statusText}`);
             }
 
-            const data = await res.json();
-            const assistantMessage = { role: 'assistant', content: data.answer };
-            setMessages(prev => [...prev, assistantMessage]);
+            // Le message de l'assistant est complété au fil des tokens reçus
+            let started = false;
+            await readEventStream(res, (event, data) => {
+                if (event === 'token') {
+                    if (!started) {
+                        started = true;
+                        setIsLoading(false);
+                        setMessages(prev => [...prev, { role: 'assistant', content: data.text }]);
+                        return;
+                    }
+                    setMessages(prev => {
+                        const updated = [...prev];
+                        const last = updated[updated.length - 1];
+                        updated[updated.length - 1] = { ...last, content: last.content + data.text };
+                        return updated;
+                    });
+                } else if (event === 'done' && data.timings) {
+                    // Durée des étapes côté serveur (ms) : auth, retrieval, context, llm...
+                    console.debug('Server-Timing', data.timings);
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+            });
         } catch (error) {
             console.error("Erreur lors de l'appel RAG:", error);
             const errorMessage = { role: 'assistant', content: "Erreur: Impossible de joindre le service RAG. Assurez-vous que le backend FastAPI est lancé sur le port 8000." };
@@ -49,21 +49,39 @@ const DocumentsPage = () => {
         }
     };
 
-    // --- 2. Déclencher la réindexation ---
+    // --- 2. Déclencher la réindexation (job en arrière-plan) ---
     const handleUpdateRAG = async () => {
         setIsUpdating(true);
         setUpdateStatus({ message: "Démarrage de la réindexation...", type: 'info' });
 
         try {
-            const data = await authenticatedFetch(API_UPDATE_RAG_URL, 'POST');
-            
-            // Afficher le message de succès du backend
-            setUpdateStatus({ message: data.message, type: 'success' }); 
+            const job = await authenticatedFetch(API_UPDATE_RAG_URL, 'POST');
+
+            // Suivi du job jusqu'à sa fin (l'index actuel reste utilisable pendant ce temps)
+            let jobStatus = job;
+            while (jobStatus.status === 'pending' || jobStatus.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                jobStatus = await authenticatedFetch(`${API_UPDATE_RAG_URL}/${job.job_id}`);
+                if (jobStatus.status === 'running') {
+                    const percent = Math.round(jobStatus.progress * 100);
+                    setUpdateStatus({ 
+                        message: `Réindexation en cours : ${percent}% (${jobStatus.chunks_embedded}/${jobStatus.chunks_total} chunks, ${jobStatus.elapsed_seconds}s)`, 
+                        type: 'info' 
+                    });
+                }
+            }
+
+            if (jobStatus.status === 'failed') {
+                throw new Error(jobStatus.error || 'échec de la réindexation');
+            }
 
             // Recharger la liste des documents pour inclure le nouveau
-            setTimeout(() => {
-                fetchDocuments();
-            }, 500); // Délai pour s'assurer que ChromaDB a fini de persister
+            await fetchDocuments();
+
+            setUpdateStatus({ 
+                message: `Index RAG mis à jour (version ${jobStatus.version}) en ${jobStatus.elapsed_seconds}s.`, 
+                type: 'success' 
+            }); 
             
         } catch (err) {
             setUpdateStatus({ message: `Erreur de mise à jour : ${err.message}`, type: 'error' });
@@ -3,6 +3,7 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from './AuthContext';
 import ReactMarkdown from 'react-markdown';
+import { readEventStream } from './sse';
 
 // Clé de stockage local pour identifier le programme
 const PROGRAM_STORAGE_KEY = 'userProgramData';
@@ -18,7 +19,7 @@ const ProgramPage = () => {
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState(null);
 
-    const API_URL = `${VITE_API_BASE_URL}/program/generate`;
+    const API_URL = `${VITE_API_BASE_URL}/program/generate/stream`;
 
     // --- 1. HOOK EFFECT pour la persistance ---
     // Enregistre le programme dans localStorage chaque fois que la variable 'program' change
@@ -102,7 +103,8 @@ const ProgramPage = () => {
     };
 
     // --- 2. FONCTION DE GÉNÉRATION ---
-    const generateProgram = async () => {
+    // regenerate = true force une nouvelle génération (sinon le programme mémorisé est réutilisé)
+    const generateProgram = async (regenerate = false) => {
         setIsLoading(true);
         setError(null);
         //setProgram('');
@@ -115,7 +117,7 @@ const ProgramPage = () => {
                 return;
             }
 
-            const response = await fetch(API_URL, {
+            const response = await fetch(regenerate ? `${API_URL}?regenerate=true` : API_URL, {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${token}`,
@@ -128,9 +130,19 @@ const ProgramPage = () => {
                 throw new Error(errorData.detail || `Erreur lors de la génération: ${response.status}`);
             }
 
-            const data = await response.json();
-            // L'API renvoie le programme dans 'program'. Si votre backend renvoie 'program_text', utilisez setProgram(data.program_text)
-            setProgram(data.program); 
+            // Le programme s'affiche au fil de la génération (Server-Sent Events)
+            let programText = '';
+            await readEventStream(response, (event, data) => {
+                if (event === 'token') {
+                    programText += data.text;
+                    setProgram(programText);
+                } else if (event === 'done' && data.timings) {
+                    // Durée des étapes côté serveur (ms) : auth, retrieval, context, llm...
+                    console.debug('Server-Timing', data.timings);
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+            });
 
         } catch (err) {
             console.error('Erreur de génération de programme:', err);
@@ -175,12 +187,21 @@ const ProgramPage = () => {
 
             <div style={{ textAlign: 'center' }}>
                 <button 
-                    onClick={generateProgram} 
+                    onClick={() => generateProgram(false)} 
                     style={styles.button} 
                     disabled={isLoading}
                 >
                     {isLoading ? 'Génération en cours...' : 'Générer Mon Programme'}
                 </button>
+                {program && (
+                    <button 
+                        onClick={() => generateProgram(true)} 
+                        style={{ ...styles.button, marginLeft: '10px' }} 
+                        disabled={isLoading}
+                    >
+                        Régénérer
+                    </button>
+                )}
             </div>
             
             {error && <div style={styles.error}>🚨 {error}</div>}
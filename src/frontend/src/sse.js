@@ -0,0 +1,32 @@
+// src/frontend/src/sse.js
+// Lecture d'une réponse Server-Sent Events obtenue avec fetch (POST + en-tête Authorization,
+// ce que EventSource ne permet pas). onEvent(event, data) est appelé pour chaque événement reçu.
+
+export const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Les événements sont séparés par une ligne vide
+        let separatorIndex;
+        while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separatorIndex);
+            buffer = buffer.slice(separatorIndex + 2);
+
+            let event = 'message';
+            const dataLines = [];
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            }
+            if (dataLines.length > 0) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+};
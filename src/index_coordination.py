@@ -0,0 +1,109 @@
+# src/index_coordination.py
+# Coordination de l'index entre plusieurs workers uvicorn (--workers N) partageant le
+# même dossier de versions :
+#  - un verrou de fichier élit l'écrivain : un seul processus à la fois prépare, remplit
+#    et publie une version (les autres n'embeddent rien et ne touchent pas aux dossiers) ;
+#  - chaque worker surveille le fichier CURRENT et charge la nouvelle version publiée,
+#    en lecture seule, dès qu'elle apparaît.
+# Le verrou est libéré par le système si le processus écrivain meurt.
+
+import os
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+from indexing import read_current_version
+
+WRITER_LOCK_FILENAME = ".writer.lock"
+
+
+class WriterLock:
+    """Verrou exclusif inter-processus sur un fichier (flock sous POSIX, msvcrt sous Windows)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """Prend le verrou s'il est libre ; False s'il est détenu par un autre processus."""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def acquire(self, poll_interval: float = 0.5, on_wait: Optional[Callable[[], None]] = None):
+        """Attend le verrou ; on_wait() est appelé une fois si un autre processus le détient."""
+        if self.try_acquire():
+            return
+        if on_wait is not None:
+            on_wait()
+        while not self.try_acquire():
+            time.sleep(poll_interval)
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if sys.platform == "win32":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class VersionWatcher:
+    """
+    Thread qui relit CURRENT toutes les interval secondes et appelle on_published(version)
+    quand la version publiée change. Les erreurs du callback sont affichées, pas propagées :
+    le worker continue de servir la version précédente et réessaie au tour suivant.
+    """
+
+    def __init__(self, root: str, on_published: Callable[[str], None], interval: float = 5.0):
+        self.root = root
+        self.on_published = on_published
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="rag-index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            version = read_current_version(self.root)
+            if version is None:
+                continue
+            try:
+                self.on_published(version)
+            except Exception as e:
+                print(f"Erreur lors du chargement de la version {version} de l'index : {e}")
@@ -0,0 +1,179 @@
+# src/index_jobs.py
+# Exécution des reconstructions de l'index RAG en arrière-plan.
+# Les jobs sont exécutés un par un (un seul thread d'indexation) et leur état
+# est consultable via GET /update_rag/{job_id}.
+# Avec plusieurs workers, la requête de suivi peut arriver sur un autre worker que celui
+# qui exécute le job : l'état est donc aussi écrit dans state_dir (un JSON par job,
+# à côté des versions de l'index), où tous les workers le relisent.
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Set
+
+
+class IndexJob:
+    """État d'une reconstruction de l'index."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "pending" # pending -> running -> succeeded | failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.version: Optional[str] = None
+        self.files: Optional[Set[str]] = None # Fichiers à synchroniser (None = tout le dossier docs)
+        self.stats: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.on_change: Optional[Callable[["IndexJob"], None]] = None # Publication de l'état (IndexJobManager)
+        self._published_at = 0.0
+
+    def update_progress(self, chunks_embedded: int, chunks_total: int):
+        """Callback de progression appelé par l'indexation après chaque lot écrit."""
+        self.chunks_embedded = chunks_embedded
+        self.chunks_total = chunks_total
+        # Au plus une écriture de l'état par seconde pendant l'indexation
+        if self.on_change is not None and time.time() - self._published_at >= 1.0:
+            self.publish()
+
+    def publish(self):
+        self._published_at = time.time()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def to_dict(self) -> Dict:
+        """Représentation JSON du job (pour l'endpoint de statut)."""
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        if self.status == "succeeded":
+            progress = 1.0
+        elif self.chunks_total:
+            progress = self.chunks_embedded / self.chunks_total
+        else:
+            progress = 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(progress, 3),
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_total": self.chunks_total,
+            "elapsed_seconds": round(elapsed, 2),
+            "version": self.version,
+            "files": sorted(self.files) if self.files is not None else None,
+            "stats": self.stats,
+            "error": self.error,
+        }
+
+
+class IndexJobManager:
+    """File des reconstructions : un seul job s'exécute à la fois."""
+
+    def __init__(self, max_jobs_kept: int = 50, state_dir: Optional[str] = None):
+        self.jobs: Dict[str, IndexJob] = {}
+        self.max_jobs_kept = max_jobs_kept
+        self.state_dir = state_dir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-index")
+        self._lock = threading.Lock()
+        self._builds: Dict[str, Callable] = {} # Build des jobs en attente (fusion des demandes identiques)
+
+    def submit(self, build: Callable[[IndexJob], Optional[Dict]], files: Optional[Iterable[str]] = None) -> IndexJob:
+        """
+        Planifie build(job) en arrière-plan, limité aux fichiers 'files' s'ils sont donnés.
+        Si un job exécutant le même build est déjà en attente (pas encore démarré), il couvre
+        aussi cette demande : ses fichiers sont complétés (ou il devient complet) et il est retourné.
+        """
+        with self._lock:
+            for job in self.jobs.values():
+                if job.status == "pending" and self._builds.get(job.id) is build:
+                    if files is None:
+                        job.files = None
+                    elif job.files is not None:
+                        job.files.update(files)
+                    job.publish()
+                    return job
+            job = IndexJob()
+            job.files = set(files) if files is not None else None
+            job.on_change = self._save
+            self.jobs[job.id] = job
+            self._builds[job.id] = build
+            self._forget_old_jobs()
+        job.publish()
+        self._executor.submit(self._run, job, build)
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self.jobs.get(job_id)
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        """État d'un job de ce worker, ou à défaut celui publié par un autre worker (None si inconnu)."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        path = self._state_path(job_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None # Fichier en cours de remplacement ou supprimé entre-temps
+
+    # --- État partagé entre workers ---
+
+    def _state_path(self, job_id: str) -> Optional[str]:
+        # L'id vient de l'URL : seuls les ids générés par uuid4().hex sont acceptés
+        if self.state_dir is None or len(job_id) != 32 or not all(char in "0123456789abcdef" for char in job_id):
+            return None
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job: IndexJob):
+        """Écrit l'état du job de manière atomique (une erreur d'écriture n'interrompt pas le job)."""
+        path = self._state_path(job.id)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f, default=str)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"ATTENTION : état du job {job.id} non enregistré ({e}).")
+
+    def _run(self, job: IndexJob, build: Callable[[IndexJob], Optional[Dict]]):
+        with self._lock: # Plus aucune demande ne peut modifier job.files
+            job.status = "running"
+            del self._builds[job.id]
+        job.started_at = time.time()
+        try:
+            job.publish()
+            job.stats = build(job)
+            # Version publiée, mais un fichier demandé (POST /documents) n'a pas pu être indexé
+            failed_files = sorted(set(job.files or ()) & set((job.stats or {}).get("failed", {})))
+            if failed_files:
+                job.error = f"Fichier(s) non indexé(s) : {', '.join(failed_files)}"
+                job.status = "failed"
+            else:
+                job.status = "succeeded"
+        except Exception as e:
+            print(f"Erreur lors de la reconstruction de l'index (job {job.id}) : {e}")
+            job.error = e.__class__.__name__
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.publish()
+
+    def _forget_old_jobs(self):
+        """Limite l'historique conservé (en mémoire et dans state_dir) aux jobs terminés les plus récents."""
+        finished = [job for job in self.jobs.values() if job.status in ("succeeded", "failed")]
+        for job in sorted(finished, key=lambda job: job.created_at)[:-self.max_jobs_kept]:
+            del self.jobs[job.id]
+            path = self._state_path(job.id)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,620 @@
+# src/indexing.py
+# Indexation incrémentale des PDF du dossier docs dans la base vectorielle.
+# Un manifeste (un fichier JSON à côté de la base Chroma) garde, pour chaque PDF,
+# son empreinte et les ids des chunks indexés : seuls les fichiers ajoutés/modifiés
+# sont ré-embeddés, et les chunks des fichiers supprimés sont retirés de la collection.
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+from vector_index import NumpyVectorStore
+from lexical_index import LexicalIndex, LEXICAL_INDEX_DIRNAME
+from metrics import observe_stage, stage
+
+# Dépendances de l'indexation seule (pypdf, text splitters, cache d'ingestion, dédoublonnage) :
+# importées à l'usage, pour qu'un worker qui sert la version publiée sans réindexer ne les charge jamais.
+if TYPE_CHECKING:
+    from embedding_scheduler import EmbeddingScheduler
+    from ingest_cache import IngestCache
+    from chunk_dedup import NearDuplicateIndex
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+CURRENT_VERSION_FILENAME = "CURRENT"
+PUBLISHED_FILENAME = "published.json" # Date de publication de chaque version
+
+
+# --- 1. Manifeste ---
+
+def manifest_path(persist_directory: str) -> str:
+    """Chemin du manifeste associé à une base vectorielle persistée."""
+    return os.path.join(persist_directory, MANIFEST_FILENAME)
+
+def load_manifest(persist_directory: str) -> Dict:
+    """Charge le manifeste s'il existe, sinon retourne un manifeste vide."""
+    path = manifest_path(persist_directory)
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ATTENTION: Manifeste illisible ({e}), il sera reconstruit.")
+        return {"version": MANIFEST_VERSION, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+def save_manifest(persist_directory: str, manifest: Dict):
+    """Écrit le manifeste de manière atomique (fichier temporaire puis rename)."""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = manifest_path(persist_directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# --- 2. Versions de l'index (déploiement blue-green) ---
+# Chaque reconstruction écrit dans un nouveau sous-dossier "v<N>" de la base ; le fichier
+# CURRENT désigne la version publiée, celle utilisée pour répondre aux requêtes.
+
+def read_current_version(root: str) -> Optional[str]:
+    """Nom de la version publiée (ex: 'v3'), ou None si aucune."""
+    path = os.path.join(root, CURRENT_VERSION_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        version = f.read().strip()
+    return version if version and os.path.isdir(os.path.join(root, version)) else None
+
+def list_versions(root: str) -> List[str]:
+    """Versions présentes sur disque, de la plus ancienne à la plus récente."""
+    if not os.path.isdir(root):
+        return []
+    versions = [name for name in os.listdir(root) if name.startswith("v") and name[1:].isdigit()]
+    return sorted(versions, key=lambda name: int(name[1:]))
+
+def prepare_next_version(root: str) -> Tuple[str, str]:
+    """
+    Crée le dossier de la prochaine version en copiant la version publiée
+    (la synchronisation incrémentale repart ainsi de l'index existant).
+    Retourne (nom de la version, chemin).
+    """
+    os.makedirs(root, exist_ok=True)
+    versions = list_versions(root)
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1}"
+    path = os.path.join(root, version)
+    current = read_current_version(root)
+    if current is not None:
+        shutil.copytree(os.path.join(root, current), path)
+    else:
+        os.makedirs(path)
+    return version, path
+
+def read_publication_times(root: str) -> Dict[str, float]:
+    """{version: date de publication} des versions publiées (vide si inconnu)."""
+    path = os.path.join(root, PUBLISHED_FILENAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_publication_times(root: str, published: Dict[str, float]):
+    path = os.path.join(root, PUBLISHED_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(published, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def publish_version(root: str, version: str):
+    """Désigne atomiquement 'version' comme version publiée (et note la date de publication)."""
+    published = read_publication_times(root)
+    published[version] = time.time()
+    write_publication_times(root, published)
+    path = os.path.join(root, CURRENT_VERSION_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+
+def cleanup_old_versions(root: str, keep: int = 2, grace_seconds: float = 0.0):
+    """
+    Supprime les anciennes versions en gardant les 'keep' plus récentes (et toujours la publiée).
+    Une version remplacée depuis moins de grace_seconds est aussi gardée : les autres workers
+    peuvent encore la servir tant qu'ils n'ont pas rechargé la nouvelle (VersionWatcher).
+    """
+    current = read_current_version(root)
+    published = read_publication_times(root)
+    versions = list_versions(root)
+    now = time.time()
+    for position, version in enumerate(versions[:-keep]):
+        if version == current:
+            continue
+        # Une version cesse d'être servie quand une version plus récente est publiée
+        replaced_at = min((published[later] for later in versions[position + 1:] if later in published), default=None)
+        if replaced_at is not None and now - replaced_at < grace_seconds:
+            continue
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    remaining = set(list_versions(root))
+    if any(version not in remaining for version in published):
+        write_publication_times(root, {version: at for version, at in published.items() if version in remaining})
+
+
+# --- 3. Détection des changements ---
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Calcule le SHA-256 du contenu d'un fichier par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def list_pdf_files(docs_path: str) -> Dict[str, str]:
+    """Retourne {nom du fichier: chemin} pour tous les PDF du dossier."""
+    if not os.path.isdir(docs_path):
+        return {}
+    return {
+        filename: os.path.join(docs_path, filename)
+        for filename in sorted(os.listdir(docs_path))
+        if filename.lower().endswith(".pdf")
+    }
+
+def is_entry_current(entry: Dict, path: str, chunk_size: int, chunk_overlap: int) -> bool:
+    """
+    Vérifie si l'entrée du manifeste correspond toujours au fichier sur disque.
+    La taille et la date de modification servent de test rapide ; le hash n'est
+    recalculé que si elles ont changé (ex: fichier recopié à l'identique).
+    """
+    if entry.get("chunk_size") != chunk_size or entry.get("chunk_overlap") != chunk_overlap:
+        return False
+    stat = os.stat(path)
+    if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+        return True
+    if entry.get("size") != stat.st_size:
+        return False
+    if entry.get("sha256") == file_sha256(path):
+        # Contenu identique : on met simplement à jour la date dans le manifeste
+        entry["mtime"] = stat.st_mtime
+        return True
+    return False
+
+def is_entry_unmodified(entry: Dict, path: str) -> bool:
+    """Test rapide (taille et date, sans lire le fichier) : le fichier n'a pas changé depuis son indexation."""
+    stat = os.stat(path)
+    return entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime
+
+
+def corpus_fingerprint(docs_path: str, chunk_size: int, **parameters) -> str:
+    """
+    Empreinte rapide du corpus (noms, tailles et dates des PDF, sans lire leur contenu) et
+    des paramètres d'indexation : si elle est inchangée, la version publiée peut être servie telle quelle.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"chunk_size": chunk_size, **parameters}, sort_keys=True).encode("utf-8"))
+    for filename, path in list_pdf_files(docs_path).items():
+        stat = os.stat(path)
+        digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+# --- 4. Découpage d'un fichier ---
+
+# Fait partie de la clé des chunks en cache : à changer si le découpage change
+SPLITTER_NAME = "recursive-character-v1"
+
+def splitter_key(chunk_size: int, chunk_overlap: int) -> str:
+    """Clé des paramètres de découpage (cache des chunks)."""
+    return f"{SPLITTER_NAME}-{chunk_size}-{chunk_overlap}"
+
+def split_documents(documents, chunk_size: int, chunk_overlap: int):
+    """Découpe les pages d'un PDF en chunks."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return text_splitter.split_documents(documents)
+
+def make_chunk_ids(filename: str, sha256: str, chunk_size: int, count: int, start: int = 0) -> List[str]:
+    """Ids déterministes des chunks d'un fichier (nom + début du hash + taille de chunk + position)."""
+    return [f"{filename}:{sha256[:16]}:{chunk_size}:{i}" for i in range(start, start + count)]
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Pic de mémoire résidente depuis le démarrage du processus (Mo), ou None si la plateforme
+    ne le fournit pas (Windows). Dans un worker de l'API, il peut dater d'avant l'indexation.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilo-octets sous Linux, octets sous macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb() -> Optional[float]:
+    """Mémoire résidente actuelle du processus (Mo), lue dans /proc (Linux) ; None ailleurs."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+# --- 5. Synchronisation de la base vectorielle ---
+
+def upsert_embeddings(vectorstore, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: List[List[float]]):
+    """Écrit un lot de chunks déjà embeddés dans la base (Chroma ou index NumPy)."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.upsert_embeddings(ids, texts, metadatas, vectors)
+    else:
+        vectorstore._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+def update_metadatas(vectorstore, ids: List[str], metadatas: List[Dict]):
+    """Complète les métadonnées de chunks déjà écrits (Chroma ou index NumPy)."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.update_metadatas(ids, metadatas)
+    else:
+        vectorstore._collection.update(ids=ids, metadatas=metadatas)
+
+def sync_vectorstore(vectorstore, docs_path: str, persist_directory: str, chunk_size: int,
+                     scheduler: "EmbeddingScheduler", max_workers: Optional[int] = None,
+                     pages_per_task: int = 50,
+                     progress: Optional[Callable[[int, int], None]] = None,
+                     lexical_index: Optional[LexicalIndex] = None,
+                     fingerprint: Optional[str] = None,
+                     max_pending_tasks: Optional[int] = None,
+                     ingest_cache: Optional["IngestCache"] = None,
+                     dedup_index: Optional["NearDuplicateIndex"] = None,
+                     only_files: Optional[Set[str]] = None) -> Dict:
+    """
+    Met à jour la base vectorielle (Chroma ou NumPy) pour refléter le contenu de docs_path.
+    Les pages sont extraites, découpées, embeddées et écrites en flux, sans jamais
+    charger tout le corpus en mémoire (max_pending_tasks : tranches de pages extraites d'avance).
+    progress(chunks écrits, chunks à écrire (estimé)) est appelé après chaque lot.
+    Avec ingest_cache, le texte extrait et les chunks de chaque fichier sont réutilisés
+    (ou enregistrés) : seul le découpage, voire seul l'embedding, est refait.
+    Si lexical_index est fourni, l'index BM25 reçoit les mêmes ajouts et suppressions
+    et est enregistré dans persist_directory.
+    Avec dedup_index, les chunks quasi identiques à un chunk déjà indexé ne sont pas embeddés :
+    le manifeste les rattache à leur représentant, dont la métadonnée 'also_in' liste leurs sources.
+    fingerprint (corpus_fingerprint, calculée avant la synchronisation) est enregistrée dans le manifeste.
+    only_files limite la synchronisation à ces fichiers (ajoutés, modifiés ou supprimés) : les autres
+    ne sont ni relus ni hachés, sauf s'ils sont réindexés par la cascade des doublons ci-dessous.
+    Retourne un résumé {added, updated, removed, unchanged, chunks_added, embedding, ingestion, dedup}.
+    """
+    from chunk_dedup import MINHASH_FILENAME, stored_chunk_ids, duplicate_references
+
+    chunk_overlap = int(chunk_size * 0.2)
+    manifest = load_manifest(persist_directory)
+    indexed = manifest["files"]
+    pdf_files = list_pdf_files(docs_path)
+    references_before = duplicate_references(indexed)
+
+    # Une base créée avant le manifeste contient des chunks aux ids inconnus : on la vide
+    if not indexed:
+        existing_ids = vectorstore.get(include=[])["ids"]
+        if existing_ids:
+            print(f"-> Base sans manifeste : suppression de {len(existing_ids)} chunks orphelins.")
+            vectorstore.delete(ids=existing_ids)
+
+    def delete_chunks(chunk_ids: List[str]):
+        vectorstore.delete(ids=chunk_ids)
+        if lexical_index is not None:
+            lexical_index.delete(chunk_ids)
+
+    def write_batch(ids: List[str], texts: List[str], metadatas: List[Dict], vectors: List[List[float]]):
+        upsert_embeddings(vectorstore, ids, texts, metadatas, vectors)
+        if lexical_index is not None:
+            lexical_index.add(ids, texts, metadatas)
+
+    # Version créée avant l'index BM25 : il est reconstruit à partir des chunks existants
+    if lexical_index is not None and indexed and len(lexical_index) == 0:
+        existing = vectorstore.get(include=["documents", "metadatas"])
+        if existing["ids"]:
+            print(f"-> Construction de l'index lexical à partir de {len(existing['ids'])} chunks existants.")
+            lexical_index.add(existing["ids"], existing["documents"], existing["metadatas"])
+
+    # Signatures MinHash des chunks indexés (recalculées pour une version qui n'en a pas)
+    if dedup_index is not None:
+        if dedup_index.load(persist_directory):
+            dedup_index.retain({chunk_id for entry in indexed.values() for chunk_id in stored_chunk_ids(entry)})
+        elif indexed:
+            existing = vectorstore.get(include=["documents"])
+            for chunk_id, text in zip(existing["ids"], existing["documents"]):
+                dedup_index.add(chunk_id, dedup_index.hasher.signature(text))
+
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "chunks_added": 0, "dedup": {}, "failed": {}}
+
+    # Hors de only_files, un fichier modifié sans passer par l'API n'est pas vu : l'empreinte du
+    # corpus n'est alors pas enregistrée, pour que le prochain démarrage fasse une synchronisation complète
+    in_scope = (lambda filename: True) if only_files is None else (lambda filename: filename in only_files)
+    out_of_scope_changed = any(not in_scope(name) for name in indexed if name not in pdf_files)
+
+    # 1. Fichiers supprimés du dossier
+    released = set() # Chunks qui vont disparaître de la base
+    for filename in [name for name in indexed if name not in pdf_files and in_scope(name)]:
+        chunk_ids = stored_chunk_ids(indexed.pop(filename))
+        if chunk_ids:
+            delete_chunks(chunk_ids)
+        released.update(chunk_ids)
+        stats["removed"] += 1
+        print(f"-> {filename} supprimé de l'index ({len(chunk_ids)} chunks).")
+
+    # 2. Fichiers ajoutés ou modifiés
+    to_index = {}
+    for filename, path in pdf_files.items():
+        entry = indexed.get(filename)
+        if not in_scope(filename):
+            if entry is None or not is_entry_unmodified(entry, path):
+                out_of_scope_changed = True
+            else:
+                stats["unchanged"] += 1
+            continue
+        if entry is not None and is_entry_current(entry, path, chunk_size, chunk_overlap):
+            stats["unchanged"] += 1
+            continue
+        to_index[filename] = path
+
+    # Un fichier dont des doublons sont rattachés à un chunk qui va disparaître est réindexé
+    # (sans dédoublonnage, tous les fichiers qui ont des doublons écartés le sont)
+    for filename in to_index:
+        if filename in indexed:
+            released.update(stored_chunk_ids(indexed[filename]))
+    changed = True
+    while changed:
+        changed = False
+        for filename, entry in indexed.items():
+            if filename in to_index or filename not in pdf_files or not entry.get("duplicates"):
+                continue
+            if dedup_index is None or any(representative in released for representative, _ in entry["duplicates"].values()):
+                to_index[filename] = pdf_files[filename]
+                released.update(stored_chunk_ids(entry))
+                stats["unchanged"] -= 1
+                changed = True
+    if dedup_index is not None:
+        dedup_index.delete(list(released))
+
+    # 3-5. Pipeline en flux : extraction (processus) -> découpage -> embeddings et écriture (threads).
+    # Chaque étage ne lit l'étage précédent que lorsqu'il a de la place : la mémoire est bornée
+    # par max_pending_tasks tranches de pages et scheduler.max_pending_batches lots de chunks.
+    filenames_by_path = {path: filename for filename, path in to_index.items()}
+    splitter = splitter_key(chunk_size, chunk_overlap)
+    pending: Dict[str, Dict] = {}
+    failed: Dict[str, str] = {}
+    produced = 0
+    written = 0
+    tasks_progress = (0, 1)
+
+    def start_file(filename: str, path: str, sha256: str) -> Dict:
+        stat = os.stat(path)
+        pending[filename] = {
+            "chunk_ids": [],
+            "duplicates": {}, # chunk écarté -> [représentant, page]
+            "entry": {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+            },
+        }
+        return pending[filename]
+
+    def emit(filename: str, chunks):
+        nonlocal produced
+        # Ids déterministes : position du chunk dans le fichier (les tranches arrivent dans l'ordre)
+        item = pending[filename]
+        chunk_ids = make_chunk_ids(filename, item["entry"]["sha256"], chunk_size, len(chunks), start=len(item["chunk_ids"]))
+        item["chunk_ids"].extend(chunk_ids)
+        kept = list(zip(chunk_ids, chunks))
+        if dedup_index is not None:
+            with stage("index", "dedup"):
+                kept = []
+                for chunk_id, chunk in zip(chunk_ids, chunks):
+                    signature = dedup_index.hasher.signature(chunk.page_content)
+                    representative = dedup_index.find(signature)
+                    if representative is not None:
+                        item["duplicates"][chunk_id] = [representative, chunk.metadata.get("page")]
+                        continue
+                    dedup_index.add(chunk_id, signature)
+                    kept.append((chunk_id, chunk))
+        produced += len(kept)
+        for chunk_id, chunk in kept:
+            yield chunk_id, chunk.page_content, chunk.metadata
+
+    def split(documents, chunks_writer=None):
+        with stage("index", "split"):
+            chunks = split_documents(documents, chunk_size, chunk_overlap)
+        if chunks_writer is not None:
+            chunks_writer.append(chunks)
+        return chunks
+
+    def iter_cached_chunks(to_extract: Dict[str, str]):
+        """Fichiers dont les chunks (ou au moins le texte) sont en cache : pypdf n'est pas lancé."""
+        for filename, path in to_index.items():
+            sha256 = file_sha256(path)
+            if ingest_cache is not None and ingest_cache.has_chunks(sha256, splitter):
+                ingest_cache.chunk_hits += 1
+                start_file(filename, path, sha256)
+                for chunks in ingest_cache.iter_chunks(sha256, splitter, path, scheduler.batch_size):
+                    yield from emit(filename, chunks)
+            elif ingest_cache is not None and ingest_cache.has_pages(sha256):
+                ingest_cache.page_hits += 1
+                start_file(filename, path, sha256)
+                chunks_writer = ingest_cache.chunks_writer(sha256, splitter)
+                for documents in ingest_cache.iter_pages(sha256, path, pages_per_task):
+                    yield from emit(filename, split(documents, chunks_writer))
+                chunks_writer.commit()
+            else:
+                to_extract[path] = sha256
+
+    def iter_chunks():
+        nonlocal tasks_progress
+        to_extract: Dict[str, str] = {}
+        yield from iter_cached_chunks(to_extract)
+        if not to_extract:
+            return
+        from pdf_loader import iter_pdf_pages
+
+        # Les autres sont extraits ; leur texte et leurs chunks sont mis en cache au passage
+        writers: Dict[str, tuple] = {}
+        def close_writers(filename: str, commit: bool):
+            for writer in writers.pop(filename, ()):
+                if commit:
+                    writer.commit()
+                else:
+                    writer.discard()
+
+        page_ranges = iter_pdf_pages(
+            list(to_extract), max_workers=max_workers,
+            pages_per_task=pages_per_task, max_pending=max_pending_tasks
+        )
+        current = None
+        try:
+            for page_range in page_ranges:
+                filename = filenames_by_path[page_range.path]
+                tasks_progress = (page_range.tasks_done, page_range.tasks_total)
+                if page_range.documents is None:
+                    failed[filename] = page_range.error
+                    close_writers(filename, commit=False)
+                    continue
+                observe_stage("index", "extract", page_range.cpu_seconds)
+                if filename != current:
+                    # Les tranches arrivent fichier par fichier : le précédent est complet
+                    if current is not None and current not in failed:
+                        close_writers(current, commit=True)
+                    current = filename
+                    sha256 = to_extract[page_range.path]
+                    start_file(filename, page_range.path, sha256)
+                    if ingest_cache is not None:
+                        ingest_cache.misses += 1
+                        writers[filename] = (ingest_cache.pages_writer(sha256), ingest_cache.chunks_writer(sha256, splitter))
+                pages_writer, chunks_writer = writers.get(filename, (None, None))
+                if pages_writer is not None:
+                    pages_writer.append(page_range.documents)
+                yield from emit(filename, split(page_range.documents, chunks_writer))
+            if current is not None and current not in failed:
+                close_writers(current, commit=True)
+        finally:
+            for filename in list(writers):
+                close_writers(filename, commit=False)
+
+    # Mémoire de cette ingestion : échantillonnée après chaque lot écrit (le pic du processus,
+    # lui, couvre toute sa durée de vie)
+    rss_start = current_rss_mb()
+    rss_peak = rss_start
+
+    def on_batch_written(count: int):
+        nonlocal written, rss_peak
+        written += count
+        rss = current_rss_mb()
+        if rss is not None and rss > rss_peak:
+            rss_peak = rss
+        if progress is not None:
+            # Le nombre total de chunks n'est connu qu'à la fin de l'extraction : il est extrapolé
+            tasks_done, tasks_total = tasks_progress
+            estimated = produced * tasks_total // tasks_done if tasks_done else produced
+            progress(written, max(written, estimated))
+
+    if progress is not None:
+        progress(0, 0)
+    started = time.perf_counter()
+    with stage("index", "ingest"):
+        stats["embedding"] = scheduler.run_stream(iter_chunks(), write_batch=write_batch, progress=on_batch_written)
+    ingest_seconds = time.perf_counter() - started
+    if progress is not None:
+        progress(written, written)
+    if ingest_cache is not None:
+        stats["ingest_cache"] = ingest_cache.stats()
+    stats["ingestion"] = {
+        "chunks": written,
+        "seconds": ingest_seconds,
+        "chunks_per_second": (written / ingest_seconds) if ingest_seconds > 0 else None,
+        "rss_start_mb": rss_start,
+        "rss_peak_mb": rss_peak,
+        "rss_increase_mb": (rss_peak - rss_start) if rss_start is not None else None,
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+    # 6. Nettoyage des anciens chunks (une fois les nouveaux écrits) et mise à jour du manifeste
+    # Fichier illisible en cours de route : ses chunks déjà écrits sont retirés et l'ancienne entrée est
+    # gardée, de même pour les fichiers dont des doublons ont été rattachés à ces chunks
+    partial_ids = set()
+    while failed:
+        filename, error = failed.popitem()
+        stats["failed"][filename] = error
+        item = pending.pop(filename, None)
+        if item is not None:
+            previous_ids = set(stored_chunk_ids(indexed.get(filename, {})))
+            new_ids = [chunk_id for chunk_id in stored_chunk_ids(item) if chunk_id not in previous_ids]
+            delete_chunks(new_ids)
+            partial_ids.update(new_ids)
+            if dedup_index is not None:
+                dedup_index.delete(new_ids)
+        print(f"ATTENTION : {filename} n'a pas pu être indexé ({error}).")
+        for other, other_item in pending.items():
+            if any(representative in partial_ids for representative, _ in other_item["duplicates"].values()):
+                failed[other] = f"doublons de {filename}"
+
+    rewritten = set()
+    for filename, item in pending.items():
+        previous = indexed.get(filename)
+        chunk_ids = item["chunk_ids"]
+        new_stored_ids = stored_chunk_ids(item)
+        rewritten.update(new_stored_ids)
+        if previous is not None:
+            new_ids = set(new_stored_ids)
+            stale_ids = [chunk_id for chunk_id in stored_chunk_ids(previous) if chunk_id not in new_ids]
+            if stale_ids:
+                delete_chunks(stale_ids)
+
+        indexed[filename] = {**item["entry"], "chunk_ids": chunk_ids, "duplicates": item["duplicates"]}
+        stats["updated" if previous is not None else "added"] += 1
+        stats["chunks_added"] += len(new_stored_ids)
+        duplicates = len(item["duplicates"])
+        stats["dedup"][filename] = {
+            "chunks": len(chunk_ids),
+            "duplicates": duplicates,
+            "ratio": duplicates / len(chunk_ids) if chunk_ids else 0.0,
+        }
+        dedup_note = f", {duplicates} doublon(s) écarté(s) ({stats['dedup'][filename]['ratio']:.0%})" if dedup_index is not None else ""
+        print(f"-> {filename} indexé ({len(chunk_ids)} chunks{dedup_note}).")
+
+    # Sources des doublons sur leur représentant (réécrit ou dont la liste a changé)
+    references = duplicate_references(indexed)
+    stored_ids = {chunk_id for entry in indexed.values() for chunk_id in stored_chunk_ids(entry)}
+    to_update = sorted(
+        representative for representative in set(references) | set(references_before)
+        if representative in stored_ids
+        and (representative in rewritten or references.get(representative) != references_before.get(representative))
+    )
+    if to_update:
+        update_metadatas(vectorstore, to_update, [{"also_in": "; ".join(references.get(chunk_id, []))} for chunk_id in to_update])
+        if lexical_index is not None:
+            lexical_index.update_metadatas(to_update, [{"also_in": "; ".join(references.get(chunk_id, []))} for chunk_id in to_update])
+
+    # L'index NumPy est écrit sur disque en une fois, à la fin de la synchronisation
+    with stage("index", "save"):
+        if isinstance(vectorstore, NumpyVectorStore):
+            vectorstore.save()
+        if lexical_index is not None:
+            lexical_index.save(os.path.join(persist_directory, LEXICAL_INDEX_DIRNAME))
+        if dedup_index is not None:
+            dedup_index.save(persist_directory)
+        elif os.path.exists(os.path.join(persist_directory, MINHASH_FILENAME)):
+            # Signatures qui ne seraient plus tenues à jour
+            os.remove(os.path.join(persist_directory, MINHASH_FILENAME))
+        manifest["corpus_fingerprint"] = fingerprint if not out_of_scope_changed else None
+        save_manifest(persist_directory, manifest)
+    if ingest_cache is not None:
+        ingest_cache.cleanup({entry["sha256"] for entry in indexed.values()})
+    return stats
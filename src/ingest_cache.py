@@ -0,0 +1,127 @@
+# src/ingest_cache.py
+# Cache persistant des étapes intermédiaires de l'indexation :
+#  - le texte extrait des pages, indexé par le SHA-256 du PDF ;
+#  - les chunks, indexés par (SHA-256 du PDF, paramètres du découpage).
+# Changer CHUNK_SIZE ou redémarrer une indexation ne relance donc ni pypdf (texte en cache)
+# ni le découpage (chunks en cache).
+# Format en colonnes, lisible par mmap sans tout charger : un blob UTF-8 (.bin) contenant
+# les textes bout à bout, les positions de début/fin de chaque texte (.offsets.npy, int64)
+# et le numéro de page de chaque texte (.pages.npy, int32).
+
+import mmap
+import os
+import shutil
+from typing import Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+PAGES_DIRNAME = "pages"
+CHUNKS_DIRNAME = "chunks"
+
+
+# --- 1. Colonnes de textes ---
+
+class TextColumnWriter:
+    """Écrit une colonne de textes au fil de l'eau ; rien n'est visible avant commit()."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        self._blob = open(prefix + ".bin.tmp", "wb")
+        self._offsets = [0]
+        self._pages: List[int] = []
+
+    def append(self, documents: Iterable[Document]):
+        for document in documents:
+            data = document.page_content.encode("utf-8")
+            self._blob.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+            self._pages.append(int(document.metadata.get("page", -1)))
+
+    def commit(self):
+        """Publie la colonne : le blob est renommé en dernier, il sert de marqueur de complétude."""
+        self._blob.close()
+        np.save(self.prefix + ".offsets.npy", np.asarray(self._offsets, dtype=np.int64))
+        np.save(self.prefix + ".pages.npy", np.asarray(self._pages, dtype=np.int32))
+        os.replace(self.prefix + ".bin.tmp", self.prefix + ".bin")
+
+    def discard(self):
+        self._blob.close()
+        os.remove(self.prefix + ".bin.tmp")
+
+
+def iter_text_column(prefix: str, source: str, batch_size: int) -> Iterator[List[Document]]:
+    """Relit une colonne par paquets de batch_size Documents (métadonnées source et page)."""
+    offsets = np.load(prefix + ".offsets.npy", mmap_mode="r")
+    pages = np.load(prefix + ".pages.npy", mmap_mode="r")
+    with open(prefix + ".bin", "rb") as f:
+        # mmap refuse les fichiers vides (PDF sans texte)
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] > 0 else b""
+        try:
+            for start in range(0, len(pages), batch_size):
+                end = min(start + batch_size, len(pages))
+                yield [
+                    Document(
+                        page_content=blob[offsets[i]:offsets[i + 1]].decode("utf-8"),
+                        metadata={"source": source, "page": int(pages[i])}
+                    )
+                    for i in range(start, end)
+                ]
+        finally:
+            if isinstance(blob, mmap.mmap):
+                blob.close()
+
+
+# --- 2. Cache ---
+
+class IngestCache:
+    """Textes des pages et chunks déjà calculés, rangés sous root/pages et root/chunks."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.page_hits = 0
+        self.chunk_hits = 0
+        self.misses = 0
+
+    def _pages_prefix(self, sha256: str) -> str:
+        return os.path.join(self.root, PAGES_DIRNAME, sha256)
+
+    def _chunks_prefix(self, sha256: str, splitter_key: str) -> str:
+        return os.path.join(self.root, CHUNKS_DIRNAME, sha256, splitter_key)
+
+    def has_pages(self, sha256: str) -> bool:
+        return os.path.exists(self._pages_prefix(sha256) + ".bin")
+
+    def has_chunks(self, sha256: str, splitter_key: str) -> bool:
+        return os.path.exists(self._chunks_prefix(sha256, splitter_key) + ".bin")
+
+    def iter_pages(self, sha256: str, source: str, batch_size: int) -> Iterator[List[Document]]:
+        """Pages du PDF (une par Document), par paquets de batch_size."""
+        return iter_text_column(self._pages_prefix(sha256), source, batch_size)
+
+    def iter_chunks(self, sha256: str, splitter_key: str, source: str, batch_size: int) -> Iterator[List[Document]]:
+        """Chunks du PDF pour ces paramètres de découpage, dans l'ordre, par paquets de batch_size."""
+        return iter_text_column(self._chunks_prefix(sha256, splitter_key), source, batch_size)
+
+    def pages_writer(self, sha256: str) -> TextColumnWriter:
+        return TextColumnWriter(self._pages_prefix(sha256))
+
+    def chunks_writer(self, sha256: str, splitter_key: str) -> TextColumnWriter:
+        return TextColumnWriter(self._chunks_prefix(sha256, splitter_key))
+
+    def cleanup(self, live_hashes: Set[str]):
+        """Supprime les entrées des fichiers qui ne sont plus dans le corpus (toutes variantes de découpage)."""
+        pages_dir = os.path.join(self.root, PAGES_DIRNAME)
+        if os.path.isdir(pages_dir):
+            for name in os.listdir(pages_dir):
+                if name.split(".")[0] not in live_hashes:
+                    os.remove(os.path.join(pages_dir, name))
+        chunks_dir = os.path.join(self.root, CHUNKS_DIRNAME)
+        if os.path.isdir(chunks_dir):
+            for name in os.listdir(chunks_dir):
+                if name not in live_hashes:
+                    shutil.rmtree(os.path.join(chunks_dir, name), ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {"chunk_hits": self.chunk_hits, "page_hits": self.page_hits, "misses": self.misses}
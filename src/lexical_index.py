@@ -0,0 +1,282 @@
+# src/lexical_index.py
+# Index lexical (BM25) construit pendant l'indexation, à côté des vecteurs.
+# La recherche par embeddings rate les requêtes à termes exacts (distances, allures comme
+# "4:30/km", noms d'aliments) : les résultats lexicaux et vectoriels sont fusionnés par
+# Reciprocal Rank Fusion (HybridRetriever). Les listes de postings sont des tableaux
+# compacts (array 'I' pour les chunks, 'H' pour les fréquences).
+
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+LEXICAL_INDEX_DIRNAME = "lexical_index"
+
+# --- 1. Tokenisation adaptée au français ---
+
+FRENCH_STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur leurs lui
+ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur
+ta te tes toi ton tu un une vos votre vous y est sont ete etre avoir ont fait plus tres bien
+comme si sans sous entre aussi donc car alors ainsi tout tous toute toutes peut doit
+""".split())
+
+# Articles et pronoms élidés ("l'entraînement", "d'effort", "qu'il")
+ELISIONS = frozenset(["l", "d", "j", "m", "n", "s", "t", "c", "qu", "jusqu", "lorsqu", "puisqu"])
+
+# Nombres avec séparateurs et unités (10km, 42.195, 4:30/km, 5h30, 60%) ou mots
+TOKEN_RE = re.compile(r"\d+(?:[.,:h]\d+)*(?:/km|km/h|kcal|km|kg|min|g|h|m|%)?|[a-z]+")
+# Unité séparée du nombre par des espaces ("10 km", "4:30 /km", "60 %") : recollée avant le
+# découpage, pour que "10 km" et "10km" donnent le même terme
+UNIT_SPACING_RE = re.compile(r"(\d)\s*(/\s*km|km/h|kcal|km|kg|min|g|h|m|%)(?![a-z])")
+
+# À incrémenter quand tokenize change : un index enregistré avec une autre version est retokenisé au chargement
+TOKENIZER_VERSION = 2
+
+def strip_accents(text: str) -> str:
+    """Supprime les accents (é -> e, î -> i...)."""
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte en termes normalisés (minuscules, sans accents, sans mots vides, pluriels réduits)."""
+    text = strip_accents(text.lower())
+    # Allures notées 4'30 ou 4’30 : même terme que 4:30
+    text = re.sub(r"(\d)['’](\d)", r"\1:\2", text)
+    text = text.replace("’", "'")
+    text = UNIT_SPACING_RE.sub(lambda m: m.group(1) + re.sub(r"\s+", "", m.group(2)), text)
+    tokens = []
+    for token in TOKEN_RE.findall(re.sub(r"\b([a-z]+)'", lambda m: " " if m.group(1) in ELISIONS else m.group(1) + " ", text)):
+        if token in FRENCH_STOPWORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        # Racinisation légère : pluriels en -s / -x
+        if token.isalpha() and len(token) > 4 and token[-1] in "sx":
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+# --- 2. Index inversé BM25 ---
+
+class LexicalIndex:
+    """Index inversé BM25 des chunks, persistant et mis à jour de manière incrémentale."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._chunk_ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._doc_lengths = array("I")
+        self._alive = array("b")
+        self._row_by_id: Dict[str, int] = {}
+        # terme -> (chunks, fréquences)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    # --- Écritures ---
+
+    def add(self, chunk_ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict]):
+        """Ajoute (ou remplace) des chunks."""
+        with self._lock:
+            self.delete([chunk_id for chunk_id in chunk_ids if chunk_id in self._row_by_id])
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                row = len(self._chunk_ids)
+                tokens = tokenize(text)
+                frequencies: Dict[str, int] = {}
+                for token in tokens:
+                    frequencies[token] = frequencies.get(token, 0) + 1
+                for token, frequency in frequencies.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = (array("I"), array("H"))
+                    postings[0].append(row)
+                    postings[1].append(min(frequency, 65535))
+                self._chunk_ids.append(chunk_id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata or {}))
+                self._doc_lengths.append(len(tokens))
+                self._alive.append(1)
+                self._row_by_id[chunk_id] = row
+
+    def delete(self, chunk_ids: Sequence[str]):
+        """Retire des chunks (marqués supprimés ; l'espace est récupéré par save())."""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                row = self._row_by_id.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = 0
+
+    def update_metadatas(self, chunk_ids: Sequence[str], metadatas: Sequence[Dict]):
+        """Complète les métadonnées de chunks existants (les clés données remplacent les anciennes)."""
+        with self._lock:
+            for chunk_id, metadata in zip(chunk_ids, metadatas):
+                row = self._row_by_id.get(chunk_id)
+                if row is not None:
+                    self._metadatas[row] = {**self._metadatas[row], **metadata}
+
+    # --- Recherche ---
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """Retourne les k chunks de meilleur score BM25 pour la requête."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._row_by_id)
+            if not terms or n_docs == 0:
+                return []
+            lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            alive = np.frombuffer(self._alive, dtype=np.int8).astype(bool)
+            average_length = float(lengths[alive].mean()) or 1.0
+            norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+            scores = np.zeros(len(self._chunk_ids), dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                rows = np.frombuffer(postings[0], dtype=np.uint32)
+                frequencies = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+                document_frequency = int(alive[rows].sum())
+                if document_frequency == 0:
+                    continue
+                idf = math.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+                # Chaque chunk apparaît au plus une fois par liste : l'indexation directe suffit
+                scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[rows])
+            scores[~alive] = 0.0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) == 0:
+                return []
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [
+                (Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._chunk_ids[row]), float(scores[row]))
+                for row in candidates
+            ]
+
+    # --- Persistance ---
+
+    def save(self, directory: str):
+        """Compacte l'index et l'écrit dans directory (tableaux NumPy + JSON)."""
+        with self._lock:
+            # Reconstruction sans les chunks supprimés (renumérotation des lignes)
+            live_rows = [row for row in range(len(self._chunk_ids)) if self._alive[row]]
+            new_row = {old: new for new, old in enumerate(live_rows)}
+            postings = {}
+            for term, (rows, frequencies) in self._postings.items():
+                kept_rows, kept_frequencies = array("I"), array("H")
+                for row, frequency in zip(rows, frequencies):
+                    if row in new_row:
+                        kept_rows.append(new_row[row])
+                        kept_frequencies.append(frequency)
+                if kept_rows:
+                    postings[term] = (kept_rows, kept_frequencies)
+            self._postings = postings
+            self._chunk_ids = [self._chunk_ids[row] for row in live_rows]
+            self._texts = [self._texts[row] for row in live_rows]
+            self._metadatas = [self._metadatas[row] for row in live_rows]
+            self._doc_lengths = array("I", (self._doc_lengths[row] for row in live_rows))
+            self._alive = array("b", [1] * len(live_rows))
+            self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._chunk_ids)}
+
+            terms = sorted(self._postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum([len(self._postings[term][0]) for term in terms], out=offsets[1:])
+            all_rows = np.concatenate([np.frombuffer(self._postings[term][0], dtype=np.uint32) for term in terms]) if terms else np.zeros(0, dtype=np.uint32)
+            all_frequencies = np.concatenate([np.frombuffer(self._postings[term][1], dtype=np.uint16) for term in terms]) if terms else np.zeros(0, dtype=np.uint16)
+
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, "postings.npz.tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    offsets=offsets,
+                    rows=all_rows,
+                    frequencies=all_frequencies,
+                    doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.uint32),
+                )
+            os.replace(tmp_path, os.path.join(directory, "postings.npz"))
+            tmp_path = os.path.join(directory, "docstore.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"tokenizer": TOKENIZER_VERSION, "terms": terms, "chunk_ids": self._chunk_ids, "texts": self._texts, "metadatas": self._metadatas},
+                    f, ensure_ascii=False
+                )
+            os.replace(tmp_path, os.path.join(directory, "docstore.json"))
+
+    @classmethod
+    def load(cls, directory: str) -> "LexicalIndex":
+        """Charge un index sauvegardé (index vide si le dossier n'existe pas)."""
+        index = cls()
+        if not os.path.exists(os.path.join(directory, "docstore.json")):
+            return index
+        with open(os.path.join(directory, "docstore.json"), "r", encoding="utf-8") as f:
+            docstore = json.load(f)
+        if docstore.get("tokenizer") != TOKENIZER_VERSION:
+            # Termes calculés par une autre version de tokenize : on réindexe les textes enregistrés
+            index.add(docstore["chunk_ids"], docstore["texts"], docstore["metadatas"])
+            return index
+        arrays = np.load(os.path.join(directory, "postings.npz"))
+        offsets, rows, frequencies = arrays["offsets"], arrays["rows"], arrays["frequencies"]
+        for position, term in enumerate(docstore["terms"]):
+            start, end = offsets[position], offsets[position + 1]
+            index._postings[term] = (array("I", rows[start:end].tobytes()), array("H", frequencies[start:end].tobytes()))
+        index._chunk_ids = docstore["chunk_ids"]
+        index._texts = docstore["texts"]
+        index._metadatas = docstore["metadatas"]
+        index._doc_lengths = array("I", arrays["doc_lengths"].tobytes())
+        index._alive = array("b", [1] * len(index._chunk_ids))
+        index._row_by_id = {chunk_id: row for row, chunk_id in enumerate(index._chunk_ids)}
+        return index
+
+
+# --- 3. Retriever hybride (vecteurs + BM25, fusion RRF) ---
+
+def _document_key(document: Document) -> Tuple:
+    """Identifie un chunk indépendamment de la source du résultat (vectorielle ou lexicale)."""
+    return (document.metadata.get("source"), document.metadata.get("page"), document.page_content)
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Fusionne plusieurs classements : score(d) = somme des 1 / (rrf_k + rang)."""
+    scores: Dict[Tuple, float] = {}
+    documents: Dict[Tuple, Document] = {}
+    for results in result_lists:
+        for rank, document in enumerate(results):
+            key = _document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            if key not in documents or (documents[key].id is None and document.id is not None):
+                documents[key] = document # On garde de préférence un Document qui porte l'id du chunk
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """Combine un retriever vectoriel et l'index BM25 par Reciprocal Rank Fusion."""
+
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector_results = self.vector_retriever.invoke(query)
+        lexical_results = [document for document, _ in self.lexical_index.search(query, k=self.fetch_k)]
+        return reciprocal_rank_fusion([vector_results, lexical_results], k=self.k, rrf_k=self.rrf_k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        vector_results = await self.vector_retriever.ainvoke(query)
+        lexical_results = [document for document, _ in self.lexical_index.search(query, k=self.fetch_k)]
+        return reciprocal_rank_fusion([vector_results, lexical_results], k=self.k, rrf_k=self.rrf_k)
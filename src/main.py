@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from config import settings 
 from dotenv import load_dotenv
 from pydantic import BaseModel
@@ -7,34 +8,52 @@ from typing import Optional
 from typing import Annotated
 
 import os
+import sys
+import json
+import inspect
 import shutil
+import threading
+import time
+import uuid
 from pydantic import BaseModel, Field
 from typing import List
+from datetime import datetime
 
 # Nouveaux Imports pour l'Authentification et la BDD
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 # Imports des utilitaires BDD et Auth 
-from auth_database import get_db, User, create_tables, UserParameters
+from auth_database import get_db, User, create_tables, UserParameters, GeneratedProgram, SessionLocal, release_connection, pool_stats
 from auth_utils import get_password_hash, verify_password, create_access_token, decode_token
-from models import UserParametersBase
+from models import UserParametersBase, AuthenticatedUser
+from auth_cache import AuthCache, password_fingerprint, register_invalidation_listeners
+from indexing import (
+    sync_vectorstore, prepare_next_version, publish_version, cleanup_old_versions,
+    read_current_version, load_manifest, corpus_fingerprint
+)
+from index_jobs import IndexJob, IndexJobManager
+from rag_chains import RagChains, program_inputs, program_cache_key, PROGRAM_PROMPT_VERSION
+from semantic_cache import SemanticAnswerCache
+from vector_index import NumpyVectorStore
+from lexical_index import LexicalIndex, HybridRetriever, LEXICAL_INDEX_DIRNAME
+from context_selection import DiversifiedRetriever
+from embedding_cache import CachedEmbeddings
+from index_coordination import WriterLock, VersionWatcher, WRITER_LOCK_FILENAME
+from metrics import (
+    stage, record_cache, timing_config, start_request_timings, request_timings_ms,
+    server_timing_header, prometheus_metrics
+)
 
 from starlette.concurrency import run_in_threadpool
 
-#from langchain_openai import OpenAIEmbeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.vectorstores import Chroma
-#from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-#from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.documents import Document
+# Les clients Gemini (langchain_google_genai), Chroma (langchain_community) et les modules
+# de l'indexation sont importés à la première utilisation (voir get_embeddings,
+# get_chat_model, open_vectorstore, initialize_or_update_retriever) : ils représentent
+# l'essentiel du temps d'import de l'application (python main.py --profile-startup).
 
 #import requests
 
@@ -55,6 +74,10 @@ class Token(BaseModel):
 # Utilisé pour obtenir le token JWT depuis l'en-tête de la requête
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token") 
 
+# Cache des tokens validés (invalidé quand un utilisateur change de mot de passe ou est supprimé)
+AUTH_CACHE = AuthCache(ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS, max_entries=settings.AUTH_CACHE_MAX_ENTRIES)
+register_invalidation_listeners(AUTH_CACHE)
+
 # --- Récupération des fichiers PDF dans le dossier docs---
 class DocumentInfo(BaseModel):
     """Schéma d'un seul document."""
@@ -78,21 +101,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"], # Lisible par le frontend (fetch)
 )
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """
+    Ajoute l'en-tête Server-Timing (durée de chaque étape : auth, retrieval, llm...).
+    Pour les flux SSE, les en-têtes partent avant la génération : les durées sont
+    envoyées dans l'événement 'done'.
+    """
+    timings = start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - started)
+    return response
+
 # --- DÉFINITION DE LA STRUCTURE DE LA REQUÊTE ---
 class QueryRequest(BaseModel):
     query: str
 
 # --- FONCTIONS DE LOGIQUE D'AUTHENTIFICATION ---
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Récupère un utilisateur de la BDD par son email."""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def get_user_parameters(db: AsyncSession, user_id: int):
+    """Récupère les paramètres d'un utilisateur (ou None)."""
+    result = await db.execute(select(UserParameters).where(UserParameters.user_id == user_id))
+    return result.scalars().first()
 
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Vérifie les identifiants et retourne l'utilisateur si valides."""
-    user = get_user_by_email(db, email=email)
+    user = await get_user_by_email(db, email=email)
     if not user:
         return False
     # Vérifie le mot de passe haché
@@ -100,8 +143,38 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Annotated[Session, Depends(get_db)]):
-    """Dépendance qui vérifie la validité du token JWT."""
+def token_claims(user: User) -> dict:
+    """Contenu du JWT : email (sub), id de l'utilisateur et empreinte de son mot de passe."""
+    return {"sub": user.email, "uid": user.id, "pwd": password_fingerprint(user.hashed_password)}
+
+async def load_authenticated_user(db: AsyncSession, payload: dict) -> Optional[AuthenticatedUser]:
+    """
+    Charge l'utilisateur d'un token depuis la BDD et vérifie qu'il correspond toujours aux claims
+    (même id, mot de passe inchangé). Les tokens émis avant l'ajout de ces claims restent acceptés.
+    """
+    user = await get_user_by_email(db, payload["sub"])
+    if user is None:
+        return None
+    if payload.get("uid", user.id) != user.id:
+        return None
+    if payload.get("pwd", password_fingerprint(user.hashed_password)) != password_fingerprint(user.hashed_password):
+        return None
+    return AuthenticatedUser(id=user.id, email=user.email)
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Annotated[AsyncSession, Depends(get_db)]):
+    """
+    Dépendance qui vérifie la validité du token JWT.
+    Un token déjà validé est servi par le cache d'authentification, sans requête SQL.
+    """
+    with stage("auth", "auth"):
+        return await authenticate_token(token, db)
+
+async def authenticate_token(token: str, db: AsyncSession) -> AuthenticatedUser:
+    cached_user = AUTH_CACHE.get(token)
+    record_cache("auth", cached_user is not None)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -118,116 +191,306 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: An
         raise credentials_exception
         
     # Vérifie si l'utilisateur existe toujours dans la BDD
-    user = get_user_by_email(db, email=email)
+    user = await load_authenticated_user(db, payload)
     if user is None:
         raise credentials_exception
     
+    AUTH_CACHE.put(token, user, token_expires_at=payload.get("exp"))
     return user
 
 # --- PAGES ET FONCTIONS RAG (Inchagées) ---
 
 DOCS_PATH = "./docs" 
-CHROMA_DB_PATH = "./chroma_db_rag" # Chemin pour la base vectorielle persistante
+CHROMA_DB_PATH = "./chroma_db_rag" # Dossier racine des versions de la base vectorielle persistante
 RAG_RETRIEVER = None # Variable globale qui contiendra l'objet Retriever
+RAG_CHAINS = None # Chaînes LangChain construites pour le retriever courant
+CHAT_MODEL = None # Client du LLM, partagé par toutes les requêtes
+INDEX_VERSION = None # Version de l'index actuellement servie (ex: "v3")
+RETRIEVER_LOCK = threading.Lock() # Protège l'échange atomique du retriever
+# Reconstructions de l'index en arrière-plan ; leur état est partagé entre workers via CHROMA_DB_PATH/jobs
+INDEX_JOBS = IndexJobManager(state_dir=os.path.join(CHROMA_DB_PATH, "jobs"))
+WRITER_LOCK = None # Verrou inter-processus : seul le worker qui le détient construit une version
+INDEX_WATCHER = None # Recharge les versions publiées par un autre worker
+
+# Cache sémantique des réponses (vidé à chaque nouvelle version de l'index)
+SEMANTIC_CACHE = SemanticAnswerCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+) if settings.SEMANTIC_CACHE_ENABLED else None
+EMBEDDINGS = None # Modèle d'embedding (avec cache persistant), partagé par l'indexation et les requêtes
+
+def get_embeddings():
+    """Retourne le modèle d'embedding unique, enveloppé dans le cache SQLite."""
+    global EMBEDDINGS
+    if EMBEDDINGS is None:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        #base_embeddings = OpenAIEmbeddings()
+        base_embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
+        EMBEDDINGS = CachedEmbeddings(
+            base_embeddings,
+            model_name=settings.EMBEDDING_MODEL,
+            cache_path=settings.EMBEDDING_CACHE_PATH,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+        )
+    return EMBEDDINGS
+
+def get_chat_model():
+    """Retourne le client unique du LLM (sa session HTTP est réutilisée entre les requêtes)."""
+    global CHAT_MODEL
+    if CHAT_MODEL is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        #CHAT_MODEL = ChatOpenAI(model_name=settings.LLM_MODEL, temperature=0)
+        CHAT_MODEL = ChatGoogleGenerativeAI(model=settings.LLM_MODEL, temperature=0.2)
+    return CHAT_MODEL
+
+def get_writer_lock() -> WriterLock:
+    """Verrou d'écriture de l'index, partagé par tous les workers qui utilisent CHROMA_DB_PATH."""
+    global WRITER_LOCK
+    if WRITER_LOCK is None:
+        WRITER_LOCK = WriterLock(os.path.join(CHROMA_DB_PATH, WRITER_LOCK_FILENAME))
+    return WRITER_LOCK
+
+def open_vectorstore(persist_directory: str):
+    """Ouvre la base vectorielle d'une version de l'index selon le backend configuré."""
+    if settings.VECTOR_BACKEND == "numpy":
+        return NumpyVectorStore(embedding_function=get_embeddings(), persist_directory=persist_directory)
+    from chroma_store import ChromaStore
+    return ChromaStore(
+        persist_directory=persist_directory,
+        embedding_function=get_embeddings()
+    )
+
+def build_retriever(vectorstore, lexical_index: Optional[LexicalIndex]):
+    """
+    Retriever vectoriel, ou hybride (vecteurs + BM25) selon la configuration,
+    suivi de la sélection MMR des RETRIEVAL_K chunks parmi MMR_FETCH_K candidats.
+    """
+    k = settings.MMR_FETCH_K if settings.MMR_ENABLED else settings.RETRIEVAL_K
+    if settings.RETRIEVAL_MODE != "hybrid" or lexical_index is None:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    else:
+        retriever = HybridRetriever(
+            vector_retriever=vectorstore.as_retriever(search_kwargs={"k": settings.HYBRID_FETCH_K}),
+            lexical_index=lexical_index,
+            k=k,
+            fetch_k=settings.HYBRID_FETCH_K,
+            rrf_k=settings.RRF_K
+        )
+    if not settings.MMR_ENABLED:
+        return retriever
+    return DiversifiedRetriever(
+        base_retriever=retriever,
+        vectorstore=vectorstore,
+        embeddings=get_embeddings(),
+        k=settings.RETRIEVAL_K,
+        lambda_mult=settings.MMR_LAMBDA,
+        duplicate_threshold=settings.NEAR_DUPLICATE_THRESHOLD
+    )
 
-# --- FONCTION DE MISE À JOUR DYNAMIQUE (REMPLACE get_retriever) ---
+def current_corpus_fingerprint() -> str:
+    """Empreinte du dossier docs et des paramètres qui déterminent le contenu de l'index."""
+    return corpus_fingerprint(
+        DOCS_PATH, settings.CHUNK_SIZE,
+        embedding_model=settings.EMBEDDING_MODEL,
+        vector_backend=settings.VECTOR_BACKEND,
+        # Le dédoublonnage décide quels chunks sont embeddés
+        dedup_enabled=settings.DEDUP_ENABLED,
+        dedup_threshold=settings.DEDUP_THRESHOLD,
+        minhash_permutations=settings.MINHASH_PERMUTATIONS,
+        minhash_bands=settings.MINHASH_BANDS
+    )
 
-def initialize_or_update_retriever():
-    """Charge, re-crée, et met à jour le Vector Store pour le RAG."""
-    global RAG_RETRIEVER
-    
-    # 1. Charger les PDF depuis le dossier
-    print(f"-> Chargement des documents PDF depuis {DOCS_PATH}")
+def activate_index(version: str, vectorstore, lexical_index: Optional[LexicalIndex]):
+    """Construit les chaînes d'une version de l'index (une seule fois) et les bascule de manière atomique."""
+    global RAG_RETRIEVER, RAG_CHAINS, INDEX_VERSION
+    retriever = build_retriever(vectorstore, lexical_index)
+    chains = RagChains(retriever, get_chat_model(), index_version=version, context_max_tokens=settings.CONTEXT_MAX_TOKENS)
+    with RETRIEVER_LOCK:
+        RAG_RETRIEVER = retriever
+        RAG_CHAINS = chains
+        INDEX_VERSION = version
+    if SEMANTIC_CACHE is not None:
+        SEMANTIC_CACHE.clear() # Les réponses en cache ont été produites avec l'ancien index
+
+def load_published_index() -> bool:
+    """
+    Démarrage rapide : si la version publiée a été construite à partir du corpus actuel
+    (même empreinte), elle est ouverte directement, sans copie ni synchronisation.
+    Retourne False si une (re)construction est nécessaire.
+    """
+    version = read_current_version(CHROMA_DB_PATH)
+    if version is None:
+        return False
+    version_path = os.path.join(CHROMA_DB_PATH, version)
+    stored = load_manifest(version_path).get("corpus_fingerprint")
+    if stored is None or stored != current_corpus_fingerprint():
+        return False
+    if version != INDEX_VERSION:
+        activate_published_version(version)
+    return True
+
+def activate_published_version(version: str):
+    """Ouvre une version publiée (en lecture seule) et bascule le retriever dessus."""
+    version_path = os.path.join(CHROMA_DB_PATH, version)
+    vectorstore = open_vectorstore(version_path)
+    lexical_index = LexicalIndex.load(os.path.join(version_path, LEXICAL_INDEX_DIRNAME))
+    activate_index(version, vectorstore, lexical_index)
+
+def reload_published_index(version: str):
+    """
+    Appelé par INDEX_WATCHER avec la version désignée par CURRENT : un worker qui ne
+    construit pas l'index charge la version publiée par l'écrivain.
+    """
+    if version == INDEX_VERSION or get_writer_lock().held:
+        return # Déjà servie, ou ce worker est l'écrivain (il bascule lui-même après publication)
+    with stage("index", "reload"):
+        activate_published_version(version)
+    print(f"-> Version {version} de l'index publiée par un autre worker : chargée.")
+
+# --- FONCTION DE MISE À JOUR DYNAMIQUE (INCRÉMENTALE) ---
+
+def initialize_or_update_retriever(job: Optional[IndexJob] = None, only_if_stale: bool = False):
+    """
+    Construit et publie une nouvelle version de l'index sous le verrou d'écriture : avec
+    plusieurs workers, un seul indexe à la fois, les autres attendent leur tour.
+    Avec only_if_stale (démarrage), la construction est abandonnée si, une fois le verrou
+    obtenu, la version publiée correspond déjà au corpus (construite par un autre worker).
+    """
+    lock = get_writer_lock()
+    lock.acquire(on_wait=lambda: print("-> Un autre worker construit l'index : en attente du verrou d'écriture."))
     try:
-        loader = PyPDFDirectoryLoader(DOCS_PATH)
-        documents = loader.load()
-    except Exception as e:
-        print(f"Erreur lors du chargement des PDF : {e}")
-        documents = []
+        if only_if_stale and load_published_index():
+            print(f"-> Version {INDEX_VERSION} de l'index à jour (publiée par un autre worker) : pas de réindexation.")
+            if job is not None:
+                job.version = INDEX_VERSION
+            return None
+        return build_index_version(job)
+    finally:
+        lock.release()
+
+def build_index_version(job: Optional[IndexJob] = None):
+    """
+    Construit une nouvelle version de l'index (copie de la version publiée, puis
+    synchronisation incrémentale avec le dossier docs), puis bascule le retriever global
+    dessus. Les requêtes continuent d'utiliser l'ancienne version pendant la construction.
+    Si job.files est renseigné (POST/DELETE /documents), seuls ces fichiers sont synchronisés.
+    L'appelant doit détenir le verrou d'écriture (voir initialize_or_update_retriever).
+    """
+    from embedding_scheduler import EmbeddingScheduler
+    from ingest_cache import IngestCache
+    from chunk_dedup import MinHasher, NearDuplicateIndex
 
-    if not documents:
-        print(f"ATTENTION : Aucun document PDF trouvé dans le dossier '{DOCS_PATH}'. Le RAG sera vide.")
-        # Crée un retriever vide
-        #vectorstore = Chroma.from_documents(documents=[], embedding=OpenAIEmbeddings())
-        vectorstore = Chroma.from_documents(documents=[], embedding=GoogleGenerativeAIEmbeddings(model="text-embedding-004"))
-        RAG_RETRIEVER = vectorstore.as_retriever()
-        return
+    embeddings = get_embeddings()
 
-    print(f"-> {len(documents)} documents chargés.")
-    
-    # 2. Séparer le texte en morceaux (chunks)
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE, 
-        chunk_overlap=int(settings.CHUNK_SIZE * 0.2)
-    )
-    texts = text_splitter.split_documents(documents)
-    print(f"-> Divisé en {len(texts)} chunks.")
-    
-    # 3. Création ou mise à jour (Re-création complète pour la simplicité)
-    #embeddings = OpenAIEmbeddings()
-    embeddings = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
-    
-    # Suppression de l'ancienne DB pour forcer la re-création complète
-    if os.path.exists(CHROMA_DB_PATH):
-        try:
-            shutil.rmtree(CHROMA_DB_PATH)
-            print("-> Base vectorielle existante supprimée pour re-création.")
-        except Exception as e:
-            # Cette erreur peut se produire si le processus précédent n'a pas relâché le lock
-            print(f"ATTENTION: Impossible de supprimer le dossier Chroma: {e}")
-
-    # Création du Vector Store (et persistance)
-    vectorstore = Chroma.from_documents(
-        documents=texts, 
-        embedding=embeddings, 
-        persist_directory=CHROMA_DB_PATH
+    # 1. Préparation d'une nouvelle version à partir de la version publiée
+    with stage("index", "prepare"):
+        version, version_path = prepare_next_version(CHROMA_DB_PATH)
+    if job is not None:
+        job.version = version
+    print(f"-> Construction de la version {version} de l'index.")
+
+    try:
+        vectorstore = open_vectorstore(version_path)
+        lexical_index = LexicalIndex.load(os.path.join(version_path, LEXICAL_INDEX_DIRNAME))
+
+        # 2. Mise à jour incrémentale à partir du manifeste (embeddings par lots concurrents)
+        scheduler = EmbeddingScheduler(
+            embeddings,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+            requests_per_minute=settings.EMBEDDING_REQUESTS_PER_MINUTE,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+            max_pending_batches=settings.EMBEDDING_MAX_PENDING_BATCHES
+        )
+        only_files = job.files if job is not None else None
+        if only_files is None:
+            print(f"-> Synchronisation des documents PDF depuis {DOCS_PATH}")
+        else:
+            print(f"-> Synchronisation de {', '.join(sorted(only_files))} uniquement.")
+        fingerprint = current_corpus_fingerprint() # Calculée avant : un fichier modifié pendant la synchro sera revu
+        with stage("index", "sync"):
+            stats = sync_vectorstore(
+                vectorstore, DOCS_PATH, version_path, settings.CHUNK_SIZE, scheduler,
+                max_workers=settings.INGEST_WORKERS,
+                pages_per_task=settings.PDF_PAGES_PER_TASK,
+                max_pending_tasks=settings.PDF_MAX_PENDING_TASKS,
+                ingest_cache=IngestCache(settings.INGEST_CACHE_PATH) if settings.INGEST_CACHE_PATH else None,
+                dedup_index=NearDuplicateIndex(
+                    MinHasher(num_perm=settings.MINHASH_PERMUTATIONS),
+                    bands=settings.MINHASH_BANDS,
+                    threshold=settings.DEDUP_THRESHOLD
+                ) if settings.DEDUP_ENABLED else None,
+                progress=job.update_progress if job is not None else None,
+                lexical_index=lexical_index,
+                fingerprint=fingerprint,
+                only_files=only_files
+            )
+    except Exception:
+        # La version incomplète n'est jamais publiée
+        shutil.rmtree(version_path, ignore_errors=True)
+        raise
+
+    print(
+        f"-> {stats['added']} ajouté(s), {stats['updated']} modifié(s), "
+        f"{stats['removed']} supprimé(s), {stats['unchanged']} inchangé(s) "
+        f"({stats['chunks_added']} chunks embeddés)."
     )
-    vectorstore.persist() # Sauvegarde sur disque
-    print("-> Base vectorielle re-créée et persistée.")
+    ingestion_stats = stats["ingestion"]
+    if ingestion_stats["chunks"]:
+        print(
+            f"-> Ingestion : {ingestion_stats['chunks']} chunks en {ingestion_stats['seconds']:.1f}s "
+            f"({ingestion_stats['chunks_per_second']:.0f} chunks/s, {stats['embedding']['batches']} lots)."
+        )
+    dedup_chunks = sum(item["chunks"] for item in stats["dedup"].values())
+    dedup_duplicates = sum(item["duplicates"] for item in stats["dedup"].values())
+    if settings.DEDUP_ENABLED and dedup_chunks:
+        print(f"-> Dédoublonnage : {dedup_duplicates}/{dedup_chunks} chunks écartés ({dedup_duplicates / dedup_chunks:.0%}).")
+    if "ingest_cache" in stats:
+        ingest_cache_stats = stats["ingest_cache"]
+        print(
+            f"-> Cache d'ingestion : {ingest_cache_stats['chunk_hits']} fichier(s) avec chunks en cache, "
+            f"{ingest_cache_stats['page_hits']} avec texte en cache, {ingest_cache_stats['misses']} extrait(s)."
+        )
+    if ingestion_stats["rss_increase_mb"] is not None:
+        print(
+            f"-> Mémoire pendant l'ingestion : +{ingestion_stats['rss_increase_mb']:.0f} Mo "
+            f"(de {ingestion_stats['rss_start_mb']:.0f} à {ingestion_stats['rss_peak_mb']:.0f} Mo au plus)."
+        )
+    if ingestion_stats["process_peak_rss_mb"] is not None:
+        print(f"-> Pic de mémoire du processus depuis son démarrage : {ingestion_stats['process_peak_rss_mb']:.0f} Mo.")
+    cache_stats = embeddings.stats()
+    print(f"-> Cache d'embeddings : {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entrées.")
+    if stats["added"] + stats["updated"] + stats["unchanged"] == 0:
+        print(f"ATTENTION : Aucun document PDF trouvé dans le dossier '{DOCS_PATH}'. Le RAG sera vide.")
     
-    # 4. Définition du Retriever global
-    RAG_RETRIEVER = vectorstore.as_retriever(search_kwargs={"k": 3}) # k=3 est un bon point de départ
-    print("-> Le Retriever RAG a été mis à jour.")
+    # 3-4. Publication de la version et bascule du Retriever et des chaînes globales
+    with stage("index", "activate"):
+        publish_version(CHROMA_DB_PATH, version)
+        activate_index(version, vectorstore, lexical_index)
+    print(f"-> Le Retriever RAG a été mis à jour (version {version}).")
+
+    # 5. Nettoyage des anciennes versions (la précédente est conservée, et toute version
+    # que d'autres workers peuvent encore servir faute d'avoir rechargé la nouvelle)
+    with stage("index", "cleanup"):
+        cleanup_old_versions(
+            CHROMA_DB_PATH, keep=2,
+            grace_seconds=settings.INDEX_RELOAD_INTERVAL_SECONDS + settings.INDEX_RETENTION_MARGIN_SECONDS
+        )
+    return stats
 
 
 def rag_answer(query):
     """
-    Utilise le Retriever RAG global pour répondre à la question.
+    Utilise les chaînes RAG globales pour répondre à la question.
     """
-    global RAG_RETRIEVER
+    chains = RAG_CHAINS
     
-    # Vérification si le retriever est prêt
-    if RAG_RETRIEVER is None:
+    # Vérification si le RAG est prêt
+    if chains is None:
         return "Le système RAG est en cours d'initialisation. Veuillez réessayer."
         
-    template = """
-You are a recognized expert and a specialized coach in the field of **running, sports training, and performance nutrition**.
-Your role is to provide accurate advice and detailed information. Answer the user's question with a professional and encouraging tone.
-
-**Crucial Instructions for the Answer:**
-1. **Primary Source:** Base your answer on the **Context** provided below as a priority for all specific, numerical, or factual information.
-2. **Expert Knowledge:** If the context is insufficient or irrelevant to answer the question, use your general expert knowledge in running and nutrition to provide a useful and general answer.
-3. **Format:** Your response **MUST** be structured in two sections with the following headings:
-   - **CONCISE ANSWER:** A short, direct answer (1-2 sentences maximum).
-   - **DETAILED EXPLANATION:** A complete explanation that elaborates on the concise answer, including all supporting facts from the context or your expertise.
-4. **Transparency:** Never explicitly mention that you used the documents or that you are limited by the context.
-
-Context:
-{context}
-
-Question: {query}
-"""
-    prompt = ChatPromptTemplate.from_template(template)
-    #model = ChatOpenAI(model_name=settings.LLM_MODEL, temperature=0)
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2)
-    
-    chain = (
-        {"context": RAG_RETRIEVER, "query": RunnablePassthrough()} # Utilisation du RAG_RETRIEVER global
-        | prompt
-        | model
-        | StrOutputParser()
-    )
-    return chain.invoke(query)
+    return chains.answer_chain.invoke(query, config=timing_config("query"))
 
 # --- NOUVELLE FONCTION DE GÉNÉRATION DE PROGRAMME RAG ---
 
@@ -236,129 +499,265 @@ def rag_generate_program(user_params: UserParametersBase):
     Génère un programme sportif/nutritionnel hautement personnalisé
     en utilisant les paramètres utilisateur et le RAG.
     """
-    global RAG_RETRIEVER
+    chains = RAG_CHAINS
     
-    if RAG_RETRIEVER is None:
+    if chains is None:
         return "Le système RAG est en cours d'initialisation. Veuillez réessayer."
 
-    # 1. Préparation des paramètres utilisateur pour le prompt
-    user_data_str = f"""
---- PARAMÈTRES UTILISATEUR POUR LA PERSONNALISATION ---
-- Âge: {user_params.age if user_params.age else 'Non spécifié'} ans
-- Sexe: {user_params.gender if user_params.gender else 'Non spécifié'}
-- Poids: {user_params.weight_kg if user_params.weight_kg else 'Non spécifié'} kg
-- Taille: {user_params.height_cm if user_params.height_cm else 'Non spécifié'} cm
-- Objectif Sportif Principal: {user_params.sport_goal if user_params.sport_goal else 'Non spécifié'}
-- Niveau Actuel: {user_params.activity_level if user_params.activity_level else 'Non spécifié'}
-- Temps d'Entraînement Disponible / Semaine: {user_params.time_per_week_hours if user_params.time_per_week_hours else 'Non spécifié'} heures
-- Temps de Sommeil Moyen: {user_params.sleep_hours if user_params.sleep_hours else 'Non spécifié'} heures / nuit
-- Matériel Disponible: {user_params.equipment_available if user_params.equipment_available else 'Non spécifié'}
-- Préférence d'Entraînement (Style): {user_params.training_preference if user_params.training_preference else 'Non spécifié'}
-- Restrictions Alimentaires (Nutrition): {user_params.dietary_restrictions if user_params.dietary_restrictions else 'Aucune'}
-"""
-    
-    # 2. Définition du Prompt Système Principal
-    template = f"""
-You are a highly qualified and recognized **Elite Sports Coach** and **Performance Nutritionist**.
-Your task is to generate a comprehensive, structured, and highly personalized training program (both sport and nutrition) for the user based on their specific parameters and the expert documents provided (Context).
-
-**CRUCIAL INSTRUCTIONS:**
-1. **Goal:** The program must directly address the user's **Sport Goal** and be tailored to their **Activity Level**, **Time Available**, and **Equipment Available**.
-2. **Integration:** Integrate the knowledge from the **Context** provided by the expert documents into the structure, intensity, and rationale of the program.
-3. **Structure & Format:**
-    - The output **MUST** be structured and easy to read (using detailed Markdown).
-    - Start with a personalized summary motivation based on the user's goal.
-    - Provide a **Training Plan** (6 weeks) detailed by day (Running, Strength, Rest, etc.).
-    - Provide concise **Nutrition Recommendations** based on their goal and dietary restrictions.
-    - Provide a section with **Key Advice** (Sleep, Recovery, Hydration).
-4. **Language:** Respond entirely in **French**.
-5. **Program Duration:** The plan must cover **6 weeks** in detail.
-
-{user_data_str}
-
-Context (Expert Documents):
-{{context}}
-
-**Program Generation Request:** Generate the personalized 6-week training and nutrition program now.
-"""
-    
-    prompt = ChatPromptTemplate.from_template(template)
-    # On utilise une température plus élevée pour encourager la créativité et la personnalisation du programme
-    #model = ChatOpenAI(model_name=settings.LLM_MODEL, temperature=0.7) 
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2)
-    
-    # Requête spécifique pour le retriever afin de récupérer le contexte le plus pertinent
-    rag_query_for_retriever = f"Conseils d'entraînement et de nutrition pour un objectif de {user_params.sport_goal} avec un niveau {user_params.activity_level}. Matériel disponible : {user_params.equipment_available}."
-    
-    # La chaîne LangChain:
-    chain = (
+    return chains.program_chain.invoke(program_inputs(user_params), config=timing_config("program"))
+
+# --- VERSIONS ASYNCHRONES (utilisées par les routes, sans bloquer de thread) ---
+
+async def rag_answer_async(query: str) -> str:
+    """
+    Version asynchrone de rag_answer (retrieval + génération via ainvoke).
+    Une question assez proche d'une question déjà traitée est servie par le cache sémantique.
+    """
+    chains = RAG_CHAINS
+    if chains is None:
+        return "Le système RAG est en cours d'initialisation. Veuillez réessayer."
+    if SEMANTIC_CACHE is None:
+        return await chains.answer_chain.ainvoke(query, config=timing_config("query"))
+
+    query_vector, cached = await lookup_semantic_cache(query, chains.index_version)
+    if cached is not None:
+        return cached["answer"]
+
+    answer = await chains.answer_chain.ainvoke(query, config=timing_config("query"))
+    SEMANTIC_CACHE.store(query, query_vector, answer, chains.index_version)
+    return answer
+
+async def rag_generate_program_async(user_params: UserParametersBase) -> str:
+    """Version asynchrone de rag_generate_program."""
+    chains = RAG_CHAINS
+    if chains is None:
+        return "Le système RAG est en cours d'initialisation. Veuillez réessayer."
+    return await chains.program_chain.ainvoke(program_inputs(user_params), config=timing_config("program"))
+
+async def lookup_semantic_cache(query: str, index_version: Optional[str]):
+    """Embedding de la question et réponse en cache sémantique (ou None)."""
+    with stage("query", "semantic_cache"):
+        query_vector = await get_embeddings().aembed_query(query)
+        cached = SEMANTIC_CACHE.lookup(query_vector, index_version)
+    record_cache("semantic", cached is not None)
+    return query_vector, cached
+
+# --- PROGRAMMES MÉMORISÉS (table generated_programs) ---
+# Ces fonctions ouvrent leur propre session : elles sont aussi appelées depuis les flux SSE,
+# qui se poursuivent après la fermeture de la session de la requête.
+
+async def load_cached_program(cache_key: str) -> Optional[dict]:
+    """Retourne le programme mémorisé pour cette clé, ou None."""
+    with stage("program", "program_cache"):
+        async with SessionLocal() as db:
+            result = await db.execute(select(GeneratedProgram).where(GeneratedProgram.cache_key == cache_key))
+            cached = result.scalars().first()
+    record_cache("program", cached is not None)
+    if cached is None:
+        return None
+    return {"program": cached.program, "model": cached.model, "created_at": cached.created_at}
+
+async def save_cached_program(cache_key: str, program: str, index_version: Optional[str]):
+    """Mémorise (ou remplace) le programme généré pour cette clé."""
+    async with SessionLocal() as db:
+        try:
+            result = await db.execute(select(GeneratedProgram).where(GeneratedProgram.cache_key == cache_key))
+            cached = result.scalars().first()
+            if cached is None:
+                cached = GeneratedProgram(cache_key=cache_key)
+                db.add(cached)
+            cached.program = program
+            cached.index_version = index_version
+            cached.prompt_version = PROGRAM_PROMPT_VERSION
+            cached.model = settings.LLM_MODEL
+            cached.created_at = datetime.utcnow()
+            await db.commit()
+        except IntegrityError:
+            # Une génération concurrente a mémorisé le même programme entre-temps
+            await db.rollback()
+
+# --- STREAMING (Server-Sent Events) ---
+
+# En-têtes qui empêchent la mise en tampon du flux par les proxys
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data) -> str:
+    """Formate un événement Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sources_payload(documents) -> List[dict]:
+    """Sources (nom du fichier et page) des chunks récupérés, envoyées au client avant la génération."""
+    return [
         {
-            # Récupère le contexte en utilisant la requête spécifique
-            "context": (lambda x: rag_query_for_retriever) | RAG_RETRIEVER,
-            # Le champ 'query' est obligatoire mais son contenu est ignoré
-            "query": RunnablePassthrough() 
-        } 
-        | prompt
-        | model
-        | StrOutputParser()
-    )
-    
-    # Exécuter la chaîne.
-    return chain.invoke("Start generation")
+            "source": os.path.basename(doc.metadata.get("source", "")),
+            "page": doc.metadata.get("page"),
+            # Autres emplacements du même passage (doublons écartés à l'indexation)
+            **({"also_in": doc.metadata["also_in"].split("; ")} if doc.metadata.get("also_in") else {}),
+        }
+        for doc in documents
+    ]
+
+async def stream_rag_generation(pipeline: str, retriever, retriever_query: str, generation, build_inputs, on_complete=None):
+    """
+    Récupère le contexte, envoie immédiatement les sources (événement 'sources'),
+    puis les morceaux de texte au fil de la génération (événements 'token'),
+    et enfin un événement 'done' (ou 'error') qui contient la durée des étapes.
+    on_complete(texte complet, sources) est appelé (et attendu s'il est asynchrone) si la génération aboutit.
+    """
+    try:
+        documents = await retriever.ainvoke(retriever_query, config=timing_config(pipeline))
+        sources = sources_payload(documents)
+        yield sse_event("sources", sources)
+        with stage(pipeline, "context"):
+            inputs = build_inputs(documents)
+        parts = []
+        async for token in generation.astream(inputs, config=timing_config(pipeline)):
+            if token:
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        if on_complete is not None:
+            result = on_complete("".join(parts), sources)
+            if inspect.isawaitable(result):
+                await result
+        yield sse_event("done", {"model": settings.LLM_MODEL, "timings": request_timings_ms()})
+    except Exception as e:
+        print(f"Erreur lors de la génération en streaming: {e}")
+        yield sse_event("error", {"detail": e.__class__.__name__})
+
+async def rag_answer_stream(query: str):
+    """Version streaming de rag_answer (avec le cache sémantique)."""
+    chains = RAG_CHAINS
+    if chains is None:
+        yield sse_event("error", {"detail": "Le système RAG est en cours d'initialisation. Veuillez réessayer."})
+        return
+
+    on_complete = None
+    if SEMANTIC_CACHE is not None:
+        query_vector, cached = await lookup_semantic_cache(query, chains.index_version)
+        if cached is not None:
+            # Réponse déjà connue : envoyée en un seul événement
+            yield sse_event("sources", cached["sources"] or [])
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {"model": settings.LLM_MODEL, "cached": True, "timings": request_timings_ms()})
+            return
+        on_complete = lambda answer, sources: SEMANTIC_CACHE.store(
+            query, query_vector, answer, chains.index_version, sources=sources
+        )
+
+    async for event in stream_rag_generation(
+        "query", chains.retriever, query, chains.answer_generation,
+        lambda documents: chains.answer_inputs(query, documents),
+        on_complete=on_complete
+    ):
+        yield event
+
+async def rag_generate_program_stream(user_params: UserParametersBase, regenerate: bool = False):
+    """Version streaming de rag_generate_program (avec les programmes mémorisés)."""
+    chains = RAG_CHAINS
+    if chains is None:
+        yield sse_event("error", {"detail": "Le système RAG est en cours d'initialisation. Veuillez réessayer."})
+        return
+
+    cache_key = program_cache_key(user_params, chains.index_version, settings.LLM_MODEL)
+    if not regenerate:
+        cached = await load_cached_program(cache_key)
+        if cached is not None:
+            yield sse_event("sources", [])
+            yield sse_event("token", {"text": cached["program"]})
+            yield sse_event("done", {"model": cached["model"], "cached": True, "timings": request_timings_ms()})
+            return
+
+    async def on_complete(program: str, sources):
+        await save_cached_program(cache_key, program, chains.index_version)
+
+    inputs = program_inputs(user_params)
+    async for event in stream_rag_generation(
+        "program", chains.retriever, inputs["retriever_query"], chains.program_generation,
+        lambda documents: chains.program_generation_inputs(inputs, documents),
+        on_complete=on_complete
+    ):
+        yield event
 
 # --- DÉMARRAGE DE L'APPLICATION (Gère la BDD et le RAG) ---
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     print('='*50)
     print('INITIALISATION DE L\'APPLICATION FASTAPI')
+    started = time.perf_counter()
     
     # 1. Assurez-vous que le dossier docs existe
     if not os.path.isdir(DOCS_PATH):
         os.makedirs(DOCS_PATH)
         
     # 2. Crée les tables de la base de données (si elles n'existent pas)
-    create_tables()
+    await create_tables()
     print("-> Tables de BDD vérifiées et créées.")
 
-    # 3. Initialise le retriever RAG (première exécution)
-    initialize_or_update_retriever()
-    print('RETRIEVER CHARGÉ. Application prête.')
+    # 3. Ouvre la version publiée de l'index si le corpus n'a pas changé ; sinon la
+    # (re)construction est lancée en arrière-plan et /ready répond 503 jusqu'à sa fin.
+    # Avec plusieurs workers, un seul obtient le verrou d'écriture et construit la version ;
+    # les autres la chargent une fois publiée.
+    if await run_in_threadpool(load_published_index):
+        print(f"-> Corpus inchangé : version {INDEX_VERSION} de l'index chargée sans réindexation.")
+        print(f'RETRIEVER CHARGÉ en {time.perf_counter() - started:.1f}s. Application prête.')
+    else:
+        job = INDEX_JOBS.submit(lambda job: initialize_or_update_retriever(job, only_if_stale=True))
+        print(f"-> Corpus modifié ou index absent : construction en arrière-plan (job {job.id}).")
+
+    # 4. Rechargement à chaud des versions publiées par les autres workers
+    global INDEX_WATCHER
+    if settings.INDEX_RELOAD_INTERVAL_SECONDS > 0:
+        INDEX_WATCHER = VersionWatcher(CHROMA_DB_PATH, reload_published_index, interval=settings.INDEX_RELOAD_INTERVAL_SECONDS)
+        INDEX_WATCHER.start()
     print('='*50)
 
+@app.on_event("shutdown")
+def shutdown_event():
+    if INDEX_WATCHER is not None:
+        INDEX_WATCHER.stop()
+
+@app.get("/ready")
+def readiness():
+    """Sonde de disponibilité : 200 quand le retriever est chargé, 503 sinon (index en construction)."""
+    if RAG_CHAINS is None:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"ready": False})
+    return {"ready": True, "index_version": INDEX_VERSION}
+
 
 # --- ROUTES D'AUTHENTIFICATION ---
 
 @app.post("/register", response_model=Token)
-def register_user(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
+async def register_user(user: UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
     """Route pour l'inscription d'un nouvel utilisateur."""
     # 1. Vérifie si l'utilisateur existe déjà
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # 2. Crée le nouvel utilisateur
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
     new_user = User(email=user.email, hashed_password=hashed_password)
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # 3. Génère un token d'accès après l'inscription
-    access_token = create_access_token(data={"sub": new_user.email})
+    access_token = create_access_token(data=token_claims(new_user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 # src/main.py (MODIFICATION de la fonction login_for_access_token)
 
 @app.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # 1. Tenter de trouver l'utilisateur
-    user = db.query(User).filter(User.email == form_data.username).first()
+    # 1. Tenter de trouver l'utilisateur (la connexion est rendue au pool avant la vérification du mot de passe)
+    user = await get_user_by_email(db, form_data.username)
+    await release_connection(db)
     
     # Configuration de l'exception
     credentials_exception = HTTPException(
@@ -373,12 +772,12 @@ def login_for_access_token(
     
     # 3. 🔐 VÉRIFICATION CRUCIALE DU MOT DE PASSE 
     # Appel de la fonction 'verify_password' définie dans auth_utils.py
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
         # Si la vérification échoue, on lève l'exception et le token n'est pas créé.
         raise credentials_exception
 
     # 4. Si la vérification est réussie, on génère le token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 # --- UTILS POUR LES ROUTES SÉCURISÉES ---
@@ -386,14 +785,24 @@ def login_for_access_token(
 # Fonction pour obtenir l'utilisateur connecté via le token
 async def get_current_user_from_token(
     token: Annotated[str, Depends(oauth2_scheme)], 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    with stage("auth", "auth"):
+        return await authenticate_token_or_404(token, db)
+
+async def authenticate_token_or_404(token: str, db: AsyncSession) -> AuthenticatedUser:
+    # 0. Token déjà validé : pas de requête SQL
+    cached_user = AUTH_CACHE.get(token)
+    record_cache("auth", cached_user is not None)
+    if cached_user is not None:
+        return cached_user
+
     # 1. Décoder le token pour obtenir le payload (dictionnaire)
     # Renommage de la variable pour plus de clarté
     payload = decode_token(token) 
     
     # 2. Extraire la valeur de l'email à partir de la clé 'sub' du payload
-    email: str = payload.get("sub")
+    email: str = payload.get("sub") if payload is not None else None
     
     # Vérification de sécurité supplémentaire
     if email is None:
@@ -403,9 +812,8 @@ async def get_current_user_from_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 3. La requête de filtrage SQL fonctionne maintenant avec une chaîne de caractères (email)
-    # Ligne 307 corrigée
-    user = db.query(User).filter(User.email == email).first() 
+    # 3. Requête SQL asynchrone (sans bloquer la boucle d'événements)
+    user = await load_authenticated_user(db, payload)
     
     if user is None:
         raise HTTPException(
@@ -414,21 +822,22 @@ async def get_current_user_from_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    AUTH_CACHE.put(token, user, token_expires_at=payload.get("exp"))
     return user
 
 # --- ROUTES POUR LA GESTION DES INFORMATIONS UTILISATEUR ---
 
 @app.get("/user/parameters", response_model=UserParametersBase)
-def read_user_parameters(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db)
+async def read_user_parameters(
+    current_user: AuthenticatedUser = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupère les informations spécifiques de l'utilisateur connecté.
     Si l'utilisateur n'a pas encore d'informations (nouvelle inscription), renvoie des valeurs nulles.
     """
     # Tente de trouver les paramètres existants
-    parameters = db.query(UserParameters).filter(UserParameters.user_id == current_user.id).first()
+    parameters = await get_user_parameters(db, current_user.id)
     
     if parameters is None:
         # Si aucun paramètre n'existe, renvoie un objet avec des valeurs par défaut/nulles
@@ -437,15 +846,15 @@ def read_user_parameters(
     return parameters
 
 @app.post("/user/parameters", response_model=UserParametersBase)
-def update_user_parameters(
+async def update_user_parameters(
     params_data: UserParametersBase,
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Crée ou met à jour les informations spécifiques de l'utilisateur connecté.
     """
-    parameters = db.query(UserParameters).filter(UserParameters.user_id == current_user.id).first()
+    parameters = await get_user_parameters(db, current_user.id)
 
     if parameters:
         # Mise à jour des champs existants
@@ -456,42 +865,55 @@ def update_user_parameters(
         parameters = UserParameters(user_id=current_user.id, **params_data.model_dump())
         db.add(parameters)
 
-    db.commit()
-    db.refresh(parameters)
+    await db.commit()
+    await db.refresh(parameters)
     return parameters
 
-@app.post("/update_rag", status_code=status.HTTP_200_OK)
+@app.post("/update_rag", status_code=status.HTTP_202_ACCEPTED)
 def update_rag_endpoint(
     # Sécuriser la route : seul un utilisateur connecté peut la déclencher
-    current_user: Annotated[User, Depends(get_current_user)], 
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
 ):
     """
-    Déclenche la réindexation de tous les documents PDF du répertoire ./docs.
+    Déclenche en arrière-plan la réindexation des documents PDF du répertoire ./docs.
+    Les requêtes continuent d'être servies par l'index actuel jusqu'à la fin du job.
     """
     print(f"Requête de mise à jour RAG reçue de: {current_user.email}")
-    try:
-        initialize_or_update_retriever()
-        return {"message": "Index RAG mis à jour avec succès à partir du répertoire ./docs."}
-    except Exception as e:
+    job = INDEX_JOBS.submit(initialize_or_update_retriever)
+    return {
+        "message": "Réindexation lancée en arrière-plan.",
+        "job_id": job.id,
+        "status": job.status
+    }
+
+@app.get("/update_rag/{job_id}")
+def get_update_rag_status(
+    job_id: str,
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """Retourne l'état d'une réindexation (progression, chunks embeddés, durée)."""
+    job_status = INDEX_JOBS.get_status(job_id) # Y compris un job lancé par un autre worker
+    if job_status is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erreur lors de la mise à jour de l'index: {e.__class__.__name__}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job de réindexation introuvable."
         )
+    return job_status
 
 # ---  ROUTE /query EXISTANTE (Mode API) ---
 
 @app.post("/query")
-def process_rag_query(
+async def process_rag_query(
     request: QueryRequest,
     # AJOUT DE LA DÉPENDANCE : Seul un utilisateur connecté peut accéder à cette route
-    current_user: Annotated[User, Depends(get_current_user)], 
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
 ):
     """
     Point de terminaison pour interroger le RAG via une requête HTTP (Nécessite connexion).
     """
     print(f"Query received from authenticated user: {current_user.email}") 
 
-    answer = rag_answer(request.query)
+    answer = await rag_answer_async(request.query)
     
     return {
         "query": request.query,
@@ -499,12 +921,57 @@ def process_rag_query(
         "model": settings.LLM_MODEL
     }
 
+@app.get("/rag/cache/stats")
+def get_semantic_cache_stats(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """Statistiques du cache sémantique des réponses (taux de succès, appels LLM évités, latence)."""
+    if SEMANTIC_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **SEMANTIC_CACHE.stats()}
+
+@app.get("/db/pool/stats")
+def get_db_pool_stats(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """État du pool de connexions Postgres de ce worker (connexions empruntées, attentes, durée d'attente)."""
+    return pool_stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Métriques Prometheus : durée des étapes, tokens envoyés au LLM, succès des caches."""
+    body, content_type = prometheus_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/auth/cache/stats")
+def get_auth_cache_stats(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """Statistiques du cache d'authentification (taux de succès = requêtes SQL évitées)."""
+    return AUTH_CACHE.stats()
+
+@app.post("/query/stream")
+def process_rag_query_stream(
+    request: QueryRequest,
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """
+    Variante streaming de /query : les sources puis la réponse sont envoyées
+    au fil de l'eau en Server-Sent Events (text/event-stream).
+    """
+    print(f"Streaming query received from authenticated user: {current_user.email}") 
+    return StreamingResponse(
+        rag_answer_stream(request.query),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 DOCS_PATH = "./docs" # Définir le chemin vers vos documents RAG
 
 @app.get("/documents", response_model=DocumentListResponse)
 def get_documents_list(
     # Le Depends(get_current_user) assure que l'utilisateur est connecté pour accéder
-    current_user: Annotated[User, Depends(get_current_user)], 
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
 ):
     """
     Point de terminaison pour lister dynamiquement les documents PDF du RAG.
@@ -545,21 +1012,105 @@ def get_documents_list(
             
     return {"documents": documents_list}
 
-# --- NOUVELLE ROUTE : GÉNÉRATION DU PROGRAMME PERSONNALISÉ ---
+def validate_document_name(name: str) -> str:
+    """Nom de fichier PDF simple (pas de chemin ni de fichier caché), sinon 400."""
+    if not name or os.path.basename(name) != name or name.startswith(".") or not name.lower().endswith(".pdf"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Nom de document invalide : un nom de fichier .pdf, sans chemin, est attendu."
+        )
+    return name
 
-@app.post("/program/generate")
-async def generate_user_program(
-    current_user: Annotated[User, Depends(get_current_user_from_token)],
-    db: Annotated[Session, Depends(get_db)]
+@app.post("/documents", status_code=status.HTTP_202_ACCEPTED)
+async def upload_document(
+    filename: str,
+    request: Request,
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
 ):
     """
-    Génère un programme d'entraînement et de nutrition personnalisé 
-    en utilisant les paramètres de l'utilisateur et le RAG.
+    Ajoute (ou remplace) un PDF : le corps de la requête est le contenu brut du fichier
+    (ex: fetch(`/documents?filename=${file.name}`, {method: "POST", body: file})).
+    Il est écrit sur disque au fil de la réception, sans être chargé en mémoire, et la requête
+    est refusée (413) dès que UPLOAD_MAX_BYTES est dépassé. Seul ce fichier est ensuite indexé
+    en arrière-plan ; le reste de l'index est conservé tel quel.
+    """
+    name = validate_document_name(filename)
+    declared = request.headers.get("content-length")
+    too_large = HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"Document trop volumineux (maximum {settings.UPLOAD_MAX_BYTES} octets)."
+    )
+    if declared is not None and declared.isdigit() and int(declared) > settings.UPLOAD_MAX_BYTES:
+        raise too_large
+
+    # Écriture dans un fichier temporaire du même dossier (ignoré par l'indexation), renommé à la fin :
+    # un envoi interrompu ou refusé ne laisse jamais de PDF incomplet dans docs
+    os.makedirs(DOCS_PATH, exist_ok=True)
+    tmp_path = os.path.join(DOCS_PATH, f".upload-{uuid.uuid4().hex}.part")
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if size == 0 and not chunk.startswith(b"%PDF-"):
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail="Le contenu envoyé n'est pas un PDF."
+                    )
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise too_large
+                await run_in_threadpool(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Document vide.")
+        os.replace(tmp_path, os.path.join(DOCS_PATH, name))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print(f"Document {name} ({size} octets) reçu de: {current_user.email}")
+    job = INDEX_JOBS.submit(initialize_or_update_retriever, files=[name])
+    return {
+        "message": f"{name} enregistré, indexation lancée en arrière-plan.",
+        "name": name,
+        "size": size,
+        "job_id": job.id,
+        "status": job.status
+    }
+
+@app.delete("/documents/{name}", status_code=status.HTTP_202_ACCEPTED)
+def delete_document(
+    name: str,
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)], 
+):
+    """
+    Supprime un PDF du dossier docs ; ses chunks sont retirés de l'index en arrière-plan
+    (les fichiers dont des doublons étaient rattachés à ces chunks sont réindexés).
+    """
+    path = os.path.join(DOCS_PATH, validate_document_name(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document introuvable.")
+    os.remove(path)
+
+    print(f"Document {name} supprimé par: {current_user.email}")
+    job = INDEX_JOBS.submit(initialize_or_update_retriever, files=[name])
+    return {
+        "message": f"{name} supprimé, mise à jour de l'index lancée en arrière-plan.",
+        "job_id": job.id,
+        "status": job.status
+    }
+
+# --- NOUVELLE ROUTE : GÉNÉRATION DU PROGRAMME PERSONNALISÉ ---
+
+async def get_user_parameters_or_404(db: AsyncSession, current_user: AuthenticatedUser) -> UserParametersBase:
+    """
+    Récupère les paramètres de l'utilisateur sous forme de modèle Pydantic (404 s'ils ne sont pas renseignés).
+    La connexion est ensuite rendue au pool : elle n'est pas conservée pendant la génération.
     """
-    print(f"Demande de génération de programme reçue de: {current_user.email}")
-    
     # 1. Récupérer les paramètres utilisateur depuis la BDD
-    parameters = db.query(UserParameters).filter(UserParameters.user_id == current_user.id).first()
+    parameters = await get_user_parameters(db, current_user.id)
+    await release_connection(db)
     
     # 2. Vérifier si les paramètres existent
     if parameters is None:
@@ -569,16 +1120,44 @@ async def generate_user_program(
         )
         
     # 3. Convertir l'objet SQLAlchemy en modèle Pydantic pour une utilisation propre
-    user_params_base = UserParametersBase.model_validate(parameters)
+    return UserParametersBase.model_validate(parameters)
 
-    # 4. Appeler la logique de génération LLM+RAG
+@app.post("/program/generate")
+async def generate_user_program(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user_from_token)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    regenerate: bool = False
+):
+    """
+    Génère un programme d'entraînement et de nutrition personnalisé 
+    en utilisant les paramètres de l'utilisateur et le RAG.
+    Si un programme a déjà été généré pour les mêmes paramètres (et la même version de
+    l'index et du prompt), il est renvoyé directement, sauf avec ?regenerate=true.
+    """
+    print(f"Demande de génération de programme reçue de: {current_user.email}")
+    
+    # 1-3. Récupérer les paramètres utilisateur depuis la BDD (404 s'ils n'existent pas)
+    user_params_base = await get_user_parameters_or_404(db, current_user)
+
+    # 4. Programme déjà généré pour ces paramètres ?
+    chains = RAG_CHAINS
+    cache_key = None
+    if chains is not None:
+        cache_key = program_cache_key(user_params_base, chains.index_version, settings.LLM_MODEL)
+        if not regenerate:
+            cached = await load_cached_program(cache_key)
+            if cached is not None:
+                return {
+                    "program": cached["program"],
+                    "user_email": current_user.email,
+                    "model": cached["model"],
+                    "cached": True,
+                    "generated_at": cached["created_at"]
+                }
+
+    # 5. Appeler la logique de génération LLM+RAG
     try:
-        program_output = await run_in_threadpool(rag_generate_program, user_params_base)
-        return {
-            "program": program_output,
-            "user_email": current_user.email,
-            "model": settings.LLM_MODEL
-        }
+        program_output = await rag_generate_program_async(user_params_base)
     except Exception as e:
         print(f"Erreur lors de la génération du programme RAG: {e}")
         # Soulever une exception HTTP pour le client
@@ -587,12 +1166,47 @@ async def generate_user_program(
             detail=f"Erreur lors de la génération du programme. Cause: {e.__class__.__name__}"
         )
 
+    if cache_key is not None:
+        await save_cached_program(cache_key, program_output, chains.index_version)
+    return {
+        "program": program_output,
+        "user_email": current_user.email,
+        "model": settings.LLM_MODEL,
+        "cached": False
+    }
+
+
+@app.post("/program/generate/stream")
+async def generate_user_program_stream(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user_from_token)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    regenerate: bool = False
+):
+    """
+    Variante streaming de /program/generate : le programme est envoyé au fil
+    de la génération en Server-Sent Events (text/event-stream).
+    Un programme mémorisé est renvoyé en un seul événement, sauf avec ?regenerate=true.
+    """
+    print(f"Demande de génération de programme (streaming) reçue de: {current_user.email}")
+    user_params_base = await get_user_parameters_or_404(db, current_user)
+    return StreamingResponse(
+        rag_generate_program_stream(user_params_base, regenerate=regenerate),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 
 # --- BLOC D'EXÉCUTION CONSOLE (Mode Interactif) ---
 
 if __name__ == "__main__":
     # Ce code s'exécute UNIQUEMENT lorsque le script est lancé via 'python main.py'
 
+    # python main.py --profile-startup : temps d'import par paquet et temps jusqu'à "prêt"
+    if "--profile-startup" in sys.argv:
+        from startup_profile import run_startup_profile
+        run_startup_profile()
+        sys.exit(0)
+
     print(f"Lancement en mode console. Application: {settings.APP_NAME}")
     print(f"Modèle LLM utilisé: {settings.LLM_MODEL}")
     
@@ -0,0 +1,163 @@
+# src/metrics.py
+# Mesures de performance exposées au format Prometheus (GET /metrics) :
+# durée de chaque étape des pipelines (auth, recherche, contexte, prompt, LLM, parsing,
+# indexation), tokens envoyés au LLM et succès des caches.
+# Les durées des étapes de la requête en cours sont aussi collectées (contextvar) pour
+# l'en-tête Server-Timing et l'événement 'done' des flux SSE.
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# --- 1. Métriques ---
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Durée des étapes des pipelines RAG",
+    ["pipeline", "stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens (estimés) envoyés au LLM",
+    ["pipeline", "part"], # part : prompt (total) ou context
+)
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total",
+    "Consultations des caches",
+    ["cache", "result"], # result : hit ou miss
+)
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc(count)
+
+def record_tokens(pipeline: str, prompt_tokens: int, context_tokens: int):
+    TOKENS.labels(pipeline=pipeline, part="prompt").inc(prompt_tokens)
+    TOKENS.labels(pipeline=pipeline, part="context").inc(context_tokens)
+
+def prometheus_metrics() -> Tuple[bytes, str]:
+    """
+    Corps et type de la réponse GET /metrics.
+    Avec plusieurs workers uvicorn, définir PROMETHEUS_MULTIPROC_DIR : les métriques de
+    tous les processus sont alors agrégées.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# --- 2. Durées par requête (Server-Timing) ---
+
+# Liste (étape, durée en secondes) de la requête en cours ; None hors requête HTTP
+_REQUEST_TIMINGS: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Démarre la collecte des durées pour la requête courante (appelé par le middleware)."""
+    timings: List[Tuple[str, float]] = []
+    _REQUEST_TIMINGS.set(timings)
+    return timings
+
+def observe_stage(pipeline: str, stage_name: str, seconds: float):
+    """Enregistre la durée d'une étape (histogramme + Server-Timing de la requête en cours)."""
+    STAGE_SECONDS.labels(pipeline=pipeline, stage=stage_name).observe(seconds)
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.append((stage_name, seconds))
+
+@contextmanager
+def stage(pipeline: str, stage_name: str):
+    """Mesure la durée du bloc : with stage("query", "retrieval"): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(pipeline, stage_name, time.perf_counter() - started)
+
+def request_timings_ms() -> Dict[str, float]:
+    """Durées (ms) des étapes déjà terminées de la requête en cours, cumulées par étape."""
+    totals: Dict[str, float] = {}
+    for stage_name, seconds in _REQUEST_TIMINGS.get() or []:
+        totals[stage_name] = totals.get(stage_name, 0.0) + seconds * 1000
+    return totals
+
+def server_timing_header(timings: List[Tuple[str, float]], total_seconds: float) -> str:
+    """Valeur de l'en-tête Server-Timing (ex: 'auth;dur=1.2, retrieval;dur=85.0, total;dur=930.4')."""
+    totals: Dict[str, float] = {}
+    for stage_name, seconds in timings:
+        totals[stage_name] = totals.get(stage_name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+# --- 3. Étapes des chaînes LangChain ---
+
+class StageTimingCallback(BaseCallbackHandler):
+    """
+    Mesure les étapes d'une chaîne LCEL via les callbacks : recherche (retriever), contexte
+    (pack_context), mise en forme du prompt, appel du LLM et parsing de la sortie.
+    Les retrievers imbriqués (hybride, MMR) ne sont comptés qu'une fois.
+    """
+
+    # Nom du Runnable -> étape
+    CHAIN_STAGES = {"pack_context": "context", "ChatPromptTemplate": "prompt", "StrOutputParser": "parse"}
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self._runs: Dict[UUID, Tuple[str, float]] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], stage_name: Optional[str]):
+        if stage_name is None:
+            return
+        parent = self._runs.get(parent_run_id) if parent_run_id is not None else None
+        if parent is not None and parent[0] == stage_name:
+            return
+        self._runs[run_id] = (stage_name, time.perf_counter())
+
+    def _end(self, run_id: UUID):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe_stage(self.pipeline, run[0], time.perf_counter() - run[1])
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, "llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, self.CHAIN_STAGES.get(kwargs.get("name")))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+def timing_config(pipeline: str) -> Dict:
+    """Configuration à passer à invoke/ainvoke/astream pour mesurer les étapes d'une chaîne."""
+    return {"callbacks": [StageTimingCallback(pipeline)]}
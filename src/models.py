@@ -23,4 +23,9 @@ class UserParametersBase(BaseModel):
     
     # Permet à FastAPI d'utiliser ce schéma avec l'ORM SQLAlchemy
     class Config:
-        from_attributes = True # Ancien orm_mode = True
\ No newline at end of file
+        from_attributes = True # Ancien orm_mode = True
+# Identité de l'utilisateur authentifié (mise en cache par auth_cache.AuthCache)
+class AuthenticatedUser(BaseModel):
+    """Utilisateur connecté, détaché de la session SQLAlchemy."""
+    id: int
+    email: str
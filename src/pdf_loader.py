@@ -0,0 +1,172 @@
+# src/pdf_loader.py
+# Extraction parallèle du texte des PDF (remplace PyPDFDirectoryLoader, qui lit les pages en série).
+# Chaque fichier, ou chaque tranche de pages pour les gros fichiers, est traité par un
+# processus du pool : le débit d'extraction augmente avec le nombre de coeurs.
+# iter_pdf_pages produit les tranches au fil de l'extraction (mémoire bornée) ;
+# load_pdfs_parallel charge tout en mémoire.
+# NB : ce module reste volontairement léger (pas d'import de main/config) car il est
+# ré-importé par les processus enfants sous Windows (mode "spawn").
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+
+# --- 1. Travail exécuté dans les processus enfants ---
+
+def _extract_page_range(path: str, start: int, end: int) -> Tuple[List[Tuple[int, str]], float]:
+    """Extrait le texte des pages [start, end) d'un PDF. Retourne les pages et la durée."""
+    started = time.perf_counter()
+    reader = PdfReader(path)
+    pages = []
+    for page_number in range(start, min(end, len(reader.pages))):
+        pages.append((page_number, reader.pages[page_number].extract_text() or ""))
+    return pages, time.perf_counter() - started
+
+
+# --- 2. Découpage du travail ---
+
+def _count_pages(path: str) -> int:
+    """Nombre de pages d'un PDF (lecture de la table des pages uniquement)."""
+    return len(PdfReader(path).pages)
+
+def _plan_tasks(paths: List[str], pages_per_task: int) -> List[Tuple[str, int, int]]:
+    """Découpe chaque fichier en tranches de pages_per_task pages."""
+    tasks = []
+    for path in paths:
+        try:
+            total_pages = _count_pages(path)
+        except Exception as e:
+            print(f"Erreur lors de l'ouverture de {path} : {e}")
+            continue
+        for start in range(0, max(total_pages, 1), pages_per_task):
+            tasks.append((path, start, start + pages_per_task))
+    return tasks
+
+
+# --- 3. Chargement en flux ---
+
+class PageRange(NamedTuple):
+    """Tranche de pages extraite d'un PDF (documents est None si l'extraction a échoué)."""
+    path: str
+    documents: Optional[List[Document]]
+    cpu_seconds: float
+    error: Optional[str]
+    tasks_done: int
+    tasks_total: int
+
+def _to_documents(path: str, pages: List[Tuple[int, str]]) -> List[Document]:
+    return [Document(page_content=text, metadata={"source": path, "page": page_number}) for page_number, text in pages]
+
+def iter_pdf_pages(
+    paths: List[str],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = 50,
+    max_pending: Optional[int] = None,
+) -> Iterator[PageRange]:
+    """
+    Extrait les PDF en parallèle et produit les tranches de pages dans l'ordre (fichier, page).
+    Au plus max_pending tranches (par défaut 2 par processus) sont extraites d'avance :
+    la mémoire utilisée ne dépend pas de la taille du corpus.
+    Un fichier en erreur est signalé par une tranche sans documents ; ses tranches suivantes sont ignorées.
+    """
+    tasks = _plan_tasks(paths, pages_per_task)
+    planned = set(task[0] for task in tasks)
+    failed = set()
+    tasks_done = 0
+    for path in paths:
+        if path not in planned:
+            failed.add(path)
+            yield PageRange(path, None, 0.0, "unreadable", tasks_done, len(tasks))
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        # Pas de pool pour une seule tâche : on évite le coût de démarrage des processus
+        for path, start, end in tasks:
+            tasks_done += 1
+            if path in failed:
+                continue
+            try:
+                pages, elapsed = _extract_page_range(path, start, end)
+            except Exception as e:
+                print(f"Erreur lors de l'extraction de {path} : {e}")
+                failed.add(path)
+                yield PageRange(path, None, 0.0, str(e), tasks_done, len(tasks))
+                continue
+            yield PageRange(path, _to_documents(path, pages), elapsed, None, tasks_done, len(tasks))
+        return
+
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        remaining = iter(tasks)
+        pending = deque()
+
+        def submit_next():
+            task = next(remaining, None)
+            if task is not None:
+                pending.append((task[0], executor.submit(_extract_page_range, *task)))
+
+        for _ in range(max_pending):
+            submit_next()
+        while pending:
+            path, future = pending.popleft()
+            tasks_done += 1
+            try:
+                pages, elapsed = future.result()
+            except Exception as e:
+                submit_next()
+                if path not in failed:
+                    print(f"Erreur lors de l'extraction de {path} : {e}")
+                    failed.add(path)
+                    yield PageRange(path, None, 0.0, str(e), tasks_done, len(tasks))
+                continue
+            submit_next()
+            if path not in failed:
+                yield PageRange(path, _to_documents(path, pages), elapsed, None, tasks_done, len(tasks))
+
+def load_pdfs_parallel(
+    paths: List[str],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = 50,
+) -> Tuple[Dict[str, List[Document]], Dict[str, Dict]]:
+    """
+    Charge une liste de PDF en parallèle (tout le texte en mémoire ; l'indexation utilise iter_pdf_pages).
+    Retourne ({chemin: [Document par page]}, {chemin: timings}).
+    Les métadonnées 'source' et 'page' sont identiques à celles de PyPDFDirectoryLoader.
+    Un fichier en erreur est absent du premier dictionnaire et signalé dans les timings.
+    """
+    if not paths:
+        return {}, {}
+
+    documents: Dict[str, List[Document]] = {path: [] for path in paths}
+    timings: Dict[str, Dict] = {path: {"pages": 0, "tasks": 0, "cpu_seconds": 0.0, "error": None} for path in paths}
+    workers = max_workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    tasks_total = 0
+
+    for page_range in iter_pdf_pages(paths, max_workers=max_workers, pages_per_task=pages_per_task, max_pending=4 * workers):
+        tasks_total = page_range.tasks_total
+        timing = timings[page_range.path]
+        if page_range.documents is None:
+            timing["error"] = page_range.error
+            documents.pop(page_range.path, None)
+            continue
+        documents[page_range.path].extend(page_range.documents)
+        timing["pages"] += len(page_range.documents)
+        timing["tasks"] += 1
+        timing["cpu_seconds"] += page_range.cpu_seconds
+
+    wall_seconds = time.perf_counter() - started
+
+    for path in paths:
+        timing = timings[path]
+        status = f"ERREUR ({timing['error']})" if timing["error"] else f"{timing['pages']} pages"
+        print(f"   - {os.path.basename(path)} : {status}, {timing['cpu_seconds']:.2f}s CPU sur {timing['tasks']} tâche(s)")
+    print(f"-> Extraction PDF terminée en {wall_seconds:.2f}s ({tasks_total} tâches, {workers} processus max).")
+
+    return documents, timings
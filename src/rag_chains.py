@@ -0,0 +1,185 @@
+# src/rag_chains.py
+# Prompts et chaînes LangChain du RAG (réponse aux questions et génération de programme).
+# Les chaînes sont construites une seule fois par version de l'index : les templates sont
+# parsés une fois et le client du modèle (et sa session HTTP) est réutilisé entre les requêtes.
+# Le contexte est rendu par context_selection.pack_context (texte + source, budget de tokens).
+
+import hashlib
+import json
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from context_selection import estimate_tokens, pack_context
+from metrics import record_tokens
+from models import UserParametersBase
+
+# --- 1. Prompts ---
+
+ANSWER_TEMPLATE = """
+You are a recognized expert and a specialized coach in the field of **running, sports training, and performance nutrition**.
+Your role is to provide accurate advice and detailed information. Answer the user's question with a professional and encouraging tone.
+
+**Crucial Instructions for the Answer:**
+1. **Primary Source:** Base your answer on the **Context** provided below as a priority for all specific, numerical, or factual information.
+2. **Expert Knowledge:** If the context is insufficient or irrelevant to answer the question, use your general expert knowledge in running and nutrition to provide a useful and general answer.
+3. **Format:** Your response **MUST** be structured in two sections with the following headings:
+   - **CONCISE ANSWER:** A short, direct answer (1-2 sentences maximum).
+   - **DETAILED EXPLANATION:** A complete explanation that elaborates on the concise answer, including all supporting facts from the context or your expertise.
+4. **Transparency:** Never explicitly mention that you used the documents or that you are limited by the context.
+
+Context:
+{context}
+
+Question: {query}
+"""
+
+# Les paramètres utilisateur sont passés en variable ({user_data}) et non insérés dans le
+# template : le template n'est parsé qu'une fois et le texte saisi ne peut pas le casser.
+PROGRAM_TEMPLATE = """
+You are a highly qualified and recognized **Elite Sports Coach** and **Performance Nutritionist**.
+Your task is to generate a comprehensive, structured, and highly personalized training program (both sport and nutrition) for the user based on their specific parameters and the expert documents provided (Context).
+
+**CRUCIAL INSTRUCTIONS:**
+1. **Goal:** The program must directly address the user's **Sport Goal** and be tailored to their **Activity Level**, **Time Available**, and **Equipment Available**.
+2. **Integration:** Integrate the knowledge from the **Context** provided by the expert documents into the structure, intensity, and rationale of the program.
+3. **Structure & Format:**
+    - The output **MUST** be structured and easy to read (using detailed Markdown).
+    - Start with a personalized summary motivation based on the user's goal.
+    - Provide a **Training Plan** (6 weeks) detailed by day (Running, Strength, Rest, etc.).
+    - Provide concise **Nutrition Recommendations** based on their goal and dietary restrictions.
+    - Provide a section with **Key Advice** (Sleep, Recovery, Hydration).
+4. **Language:** Respond entirely in **French**.
+5. **Program Duration:** The plan must cover **6 weeks** in detail.
+
+{user_data}
+
+Context (Expert Documents):
+{context}
+
+**Program Generation Request:** Generate the personalized 6-week training and nutrition program now.
+"""
+
+ANSWER_PROMPT = ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
+PROGRAM_PROMPT = ChatPromptTemplate.from_template(PROGRAM_TEMPLATE)
+
+# Version du prompt de programme, dérivée de son contenu : toute modification du template
+# invalide les programmes mémorisés.
+PROGRAM_PROMPT_VERSION = "1-" + hashlib.sha256(PROGRAM_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+
+# --- 2. Préparation des entrées du programme ---
+
+def format_user_parameters(user_params: UserParametersBase) -> str:
+    """Met en forme les paramètres utilisateur pour le prompt de génération de programme."""
+    return f"""
+--- PARAMÈTRES UTILISATEUR POUR LA PERSONNALISATION ---
+- Âge: {user_params.age if user_params.age else 'Non spécifié'} ans
+- Sexe: {user_params.gender if user_params.gender else 'Non spécifié'}
+- Poids: {user_params.weight_kg if user_params.weight_kg else 'Non spécifié'} kg
+- Taille: {user_params.height_cm if user_params.height_cm else 'Non spécifié'} cm
+- Objectif Sportif Principal: {user_params.sport_goal if user_params.sport_goal else 'Non spécifié'}
+- Niveau Actuel: {user_params.activity_level if user_params.activity_level else 'Non spécifié'}
+- Temps d'Entraînement Disponible / Semaine: {user_params.time_per_week_hours if user_params.time_per_week_hours else 'Non spécifié'} heures
+- Temps de Sommeil Moyen: {user_params.sleep_hours if user_params.sleep_hours else 'Non spécifié'} heures / nuit
+- Matériel Disponible: {user_params.equipment_available if user_params.equipment_available else 'Non spécifié'}
+- Préférence d'Entraînement (Style): {user_params.training_preference if user_params.training_preference else 'Non spécifié'}
+- Restrictions Alimentaires (Nutrition): {user_params.dietary_restrictions if user_params.dietary_restrictions else 'Aucune'}
+"""
+
+def program_retriever_query(user_params: UserParametersBase) -> str:
+    """Requête spécifique pour le retriever afin de récupérer le contexte le plus pertinent."""
+    return f"Conseils d'entraînement et de nutrition pour un objectif de {user_params.sport_goal} avec un niveau {user_params.activity_level}. Matériel disponible : {user_params.equipment_available}."
+
+def program_inputs(user_params: UserParametersBase) -> dict:
+    """Entrée de la chaîne de génération de programme."""
+    return {
+        "user_data": format_user_parameters(user_params),
+        "retriever_query": program_retriever_query(user_params),
+    }
+
+def normalize_user_parameters(user_params: UserParametersBase) -> dict:
+    """
+    Forme canonique des paramètres pour la mémorisation des programmes :
+    textes sans espaces superflus et sans casse, nombres arrondis.
+    """
+    normalized = {}
+    for field, value in user_params.model_dump().items():
+        if isinstance(value, str):
+            value = " ".join(value.split()).casefold() or None
+        elif isinstance(value, float):
+            value = round(value, 1)
+        normalized[field] = value
+    return normalized
+
+def program_cache_key(user_params: UserParametersBase, index_version: Optional[str], model_name: str) -> str:
+    """Clé de mémorisation d'un programme généré (SHA-256)."""
+    payload = json.dumps(
+        {
+            "params": normalize_user_parameters(user_params),
+            "index_version": index_version,
+            "prompt_version": PROGRAM_PROMPT_VERSION,
+            "model": model_name,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --- 3. Chaînes ---
+
+def log_tokens_in(pipeline: str, template: str, inputs: dict, context_stats: Dict):
+    """Affiche (et comptabilise dans /metrics) le nombre estimé de tokens envoyés au LLM pour une requête."""
+    tokens_in = estimate_tokens(template) + sum(estimate_tokens(value) for value in inputs.values())
+    record_tokens(pipeline, tokens_in, context_stats["tokens"])
+    reduced = ""
+    if context_stats["truncated"]:
+        reduced = f", réduit à {context_stats['sentences_kept']}/{context_stats['sentences_total']} phrases"
+    print(f"-> Tokens en entrée ({pipeline}) : ~{tokens_in} dont contexte {context_stats['tokens']} ({context_stats['chunks']} chunks{reduced}).")
+    return tokens_in
+
+
+class RagChains:
+    """Chaînes du RAG construites pour un retriever donné (une version de l'index)."""
+
+    def __init__(self, retriever, model, index_version=None, context_max_tokens: int = 1500):
+        self.retriever = retriever
+        self.model = model
+        self.index_version = index_version
+        self.context_max_tokens = context_max_tokens
+
+        # Partie génération seule (prompt -> modèle -> texte), réutilisable sans retriever
+        self.answer_generation = ANSWER_PROMPT | model | StrOutputParser()
+        self.program_generation = PROGRAM_PROMPT | model | StrOutputParser()
+
+        # Entrée : la question (str)
+        self.answer_chain = (
+            {"documents": retriever, "query": RunnablePassthrough()}
+            | RunnableLambda(lambda x: self.answer_inputs(x["query"], x["documents"]), name="pack_context")
+            | self.answer_generation
+        )
+        # Entrée : program_inputs(user_params)
+        self.program_chain = (
+            # Récupère le contexte en utilisant la requête spécifique
+            RunnablePassthrough.assign(documents=itemgetter("retriever_query") | retriever)
+            | RunnableLambda(lambda x: self.program_generation_inputs(x, x["documents"]), name="pack_context")
+            | self.program_generation
+        )
+
+    def answer_inputs(self, query: str, documents: List) -> dict:
+        """Variables du prompt de réponse, avec le contexte limité au budget de tokens."""
+        context, stats = pack_context(query, documents, self.context_max_tokens)
+        inputs = {"context": context, "query": query}
+        log_tokens_in("query", ANSWER_TEMPLATE, inputs, stats)
+        return inputs
+
+    def program_generation_inputs(self, inputs: dict, documents: List) -> dict:
+        """Variables du prompt de programme (inputs : program_inputs(user_params))."""
+        context, stats = pack_context(inputs["retriever_query"], documents, self.context_max_tokens)
+        generation_inputs = {"context": context, "user_data": inputs["user_data"]}
+        log_tokens_in("program", PROGRAM_TEMPLATE, generation_inputs, stats)
+        return generation_inputs
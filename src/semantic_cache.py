@@ -0,0 +1,139 @@
+# src/semantic_cache.py
+# Cache sémantique des réponses de /query : une question dont l'embedding est assez proche
+# (similarité cosinus >= seuil) d'une question déjà traitée reçoit la réponse enregistrée,
+# sans appel au LLM. Le cache est vidé automatiquement quand la version de l'index change.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache LRU + TTL de réponses, indexé par l'embedding normalisé de la question.
+    Les embeddings sont rangés dans une matrice float32 préallouée : la recherche
+    est un seul produit matrice-vecteur.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index_version: Optional[str] = None
+
+        self._vectors: Optional[np.ndarray] = None # (max_entries, dim), alloué au premier ajout
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._entries: Dict[int, Dict] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict() # slots, du moins au plus récemment utilisé
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._lookup_seconds = 0.0
+        self._lookups = 0
+
+    # --- Outils internes ---
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _free_slot(self, slot: int):
+        self._valid[slot] = False
+        self._entries.pop(slot, None)
+        self._lru.pop(slot, None)
+
+    def _check_version(self, index_version: Optional[str]):
+        """Vide le cache si la version de l'index a changé (appelé sous verrou)."""
+        if index_version != self.index_version:
+            self._valid[:] = False
+            self._entries.clear()
+            self._lru.clear()
+            self.index_version = index_version
+
+    # --- API publique ---
+
+    def lookup(self, query_vector: List[float], index_version: Optional[str]) -> Optional[Dict]:
+        """Retourne l'entrée {query, answer, sources, similarity} la plus proche au-dessus du seuil, ou None."""
+        started = time.perf_counter()
+        query = self._normalize(query_vector)
+        with self._lock:
+            self._check_version(index_version)
+            result = None
+            if self._vectors is not None and self._valid.any():
+                # Expiration (TTL) des entrées trop anciennes
+                now = time.time()
+                for slot in [slot for slot, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]:
+                    self._free_slot(slot)
+
+                similarities = self._vectors @ query
+                similarities[~self._valid] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._lru.move_to_end(best)
+                    entry = self._entries[best]
+                    result = {**entry, "similarity": float(similarities[best])}
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._lookups += 1
+            self._lookup_seconds += time.perf_counter() - started
+        return result
+
+    def store(self, query: str, query_vector: List[float], answer: str, index_version: Optional[str],
+              sources: Optional[List[Dict]] = None):
+        """Enregistre une réponse (l'entrée la moins récemment utilisée est évincée si le cache est plein)."""
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._check_version(index_version)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries.clear()
+                self._lru.clear()
+
+            free_slots = np.flatnonzero(~self._valid)
+            if len(free_slots):
+                slot = int(free_slots[0])
+            else:
+                slot = next(iter(self._lru))
+                self._free_slot(slot)
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = {
+                "query": query,
+                "answer": answer,
+                "sources": sources,
+                "created_at": time.time(),
+            }
+            self._lru[slot] = None
+
+    def clear(self):
+        """Vide le cache (ex: après une reconstruction de l'index)."""
+        with self._lock:
+            self._valid[:] = False
+            self._entries.clear()
+            self._lru.clear()
+
+    def stats(self) -> Dict:
+        """Taux de succès, appels LLM évités et latence moyenne de recherche."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "index_version": self.index_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else None,
+            "saved_llm_calls": self.hits,
+            "avg_lookup_ms": (self._lookup_seconds / self._lookups * 1000) if self._lookups else None,
+        }
@@ -0,0 +1,112 @@
+# src/startup_profile.py
+# Rapport de démarrage de l'API : python main.py --profile-startup
+# Lance un processus Python neuf avec -X importtime qui importe main, exécute les
+# événements de démarrage de FastAPI et attend que le retriever soit chargé (/ready),
+# puis affiche la répartition du temps d'import par paquet et le temps jusqu'à "prêt".
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Modules qui ne servent qu'à l'indexation : un worker qui sert la version publiée ne doit pas les charger
+INGESTION_ONLY_MODULES = ["pypdf", "langchain_text_splitters", "pdf_loader", "embedding_scheduler"]
+
+# Exécuté dans le processus mesuré ; le résultat est la dernière ligne de stdout
+_CHILD_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+async def run_startup():
+    for handler in main.app.router.on_startup:
+        await handler()
+asyncio.run(run_startup())
+startup_done = time.perf_counter()
+deadline = startup_done + {timeout}
+failed = False
+while main.RAG_CHAINS is None and time.perf_counter() < deadline:
+    if any(job.status == "failed" for job in main.INDEX_JOBS.jobs.values()):
+        failed = True
+        break
+    time.sleep(0.05)
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - started,
+    "startup_seconds": startup_done - imported,
+    "time_to_ready_seconds": (ready - started) if main.RAG_CHAINS is not None else None,
+    "index_build_failed": failed,
+    "index_version": main.INDEX_VERSION,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, float, float]]:
+    """Extrait (module, temps propre, temps cumulé) en secondes de la sortie de -X importtime."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return modules
+
+def aggregate_by_package(modules: List[Tuple[str, float, float]]) -> Dict[str, float]:
+    """Temps propre cumulé par paquet racine (ex: langchain_core, sqlalchemy), sans double comptage des imports imbriqués."""
+    totals: Dict[str, float] = {}
+    for name, self_seconds, _ in modules:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + self_seconds
+    return totals
+
+def run_startup_profile(top: int = 15, timeout: float = 600) -> Dict:
+    """Mesure le démarrage dans un processus neuf et affiche le rapport. Retourne les mesures."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD_SCRIPT.format(timeout=timeout)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        print(completed.stdout)
+        print(completed.stderr[-4000:])
+        raise RuntimeError(f"Le démarrage a échoué (code {completed.returncode}).")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    packages = aggregate_by_package(parse_importtime(completed.stderr))
+    loaded_ingestion_modules = [name for name in INGESTION_ONLY_MODULES if name in result["modules"]]
+
+    print("=" * 60)
+    print("PROFIL DE DÉMARRAGE")
+    print("=" * 60)
+    print(f"Import de main          : {result['import_seconds']:.2f}s")
+    print(f"Événements de démarrage : {result['startup_seconds']:.2f}s")
+    if result["time_to_ready_seconds"] is not None:
+        print(f"Temps jusqu'à prêt      : {result['time_to_ready_seconds']:.2f}s (index {result['index_version']})")
+    elif result["index_build_failed"]:
+        print("Temps jusqu'à prêt      : échec de la construction de l'index")
+    else:
+        print(f"Temps jusqu'à prêt      : non prêt après {timeout:.0f}s")
+    print(f"Processus complet       : {wall_seconds:.2f}s (interpréteur compris)")
+    print("-" * 60)
+    print(f"Temps d'import par paquet ({top} premiers) :")
+    for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<32} {seconds * 1000:>9.1f} ms")
+    print("-" * 60)
+    if loaded_ingestion_modules:
+        print(f"Modules d'indexation chargés : {', '.join(loaded_ingestion_modules)}")
+    else:
+        print("Aucun module d'indexation chargé (index servi sans réindexation).")
+
+    result.pop("modules")
+    return {
+        **result,
+        "wall_seconds": wall_seconds,
+        "imports_by_package": packages,
+        "ingestion_modules_loaded": loaded_ingestion_modules,
+    }
@@ -0,0 +1,13 @@
+# src/tests/conftest.py
+# Les modules de l'application sont importés "à plat" (from indexing import ...), comme
+# lorsque uvicorn est lancé depuis src : on ajoute donc src au chemin d'import.
+# Variables d'environnement minimales pour importer config/main sans fichier .env.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
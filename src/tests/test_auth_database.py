@@ -0,0 +1,39 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import auth_database
+from auth_database import InstrumentedPool, PoolMetrics
+
+
+def test_only_checkouts_on_an_exhausted_pool_count_as_waits(tmp_path, monkeypatch):
+    metrics = PoolMetrics()
+    monkeypatch.setattr(auth_database, "POOL_METRICS", metrics)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedPool, pool_size=1, max_overflow=0, pool_timeout=5
+    )
+
+    async def hold_connection(release: asyncio.Event):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await release.wait()
+
+    async def scenario():
+        async with engine.connect() as conn: # Connexion libre : pas d'attente
+            await conn.execute(text("SELECT 1"))
+        assert (metrics.checkouts, metrics.waits) == (1, 0)
+
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold_connection(release))
+        await asyncio.sleep(0.05)
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        async with engine.connect() as conn: # Pool épuisé : attend la libération
+            await conn.execute(text("SELECT 1"))
+        await holder
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    assert (metrics.checkouts, metrics.waits, metrics.waiting) == (3, 1, 0)
+    assert metrics.max_wait_seconds >= 0.05
@@ -0,0 +1,98 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.retrievers import BaseRetriever
+
+from context_selection import DiversifiedRetriever, estimate_tokens, merge_adjacent_chunks, mmr_select, pack_context
+from lexical_index import HybridRetriever, LexicalIndex
+from vector_index import NumpyVectorStore
+
+
+def test_mmr_select_drops_near_duplicates_and_diversifies():
+    vectors = np.array([
+        [1.0, 0.0, 0.0],
+        [1.0, 0.01, 0.0], # quasi-doublon du premier
+        [0.9, 0.4, 0.0],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    relevance = np.array([1.0, 0.95, 0.9, 0.5], dtype=np.float32)
+
+    selected = mmr_select(vectors, relevance, k=3, lambda_mult=0.5, duplicate_threshold=0.95)
+    assert selected[0] == 0
+    assert 1 not in selected
+    assert 3 in selected
+
+
+def test_mmr_select_returns_at_most_k_and_handles_empty_input():
+    vectors = np.eye(5, dtype=np.float32)
+    assert len(mmr_select(vectors, np.ones(5, dtype=np.float32), k=2)) == 2
+    assert mmr_select(np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.float32), k=2) == []
+
+
+def test_merge_adjacent_chunks_joins_overlapping_text_of_same_page():
+    first = Document(page_content="Début du texte. " * 3 + "Partie commune du chevauchement ici.", metadata={"source": "a.pdf", "page": 1})
+    second = Document(page_content="Partie commune du chevauchement ici. Suite du texte.", metadata={"source": "a.pdf", "page": 1})
+    other_page = Document(page_content="Partie commune du chevauchement ici.", metadata={"source": "a.pdf", "page": 2})
+
+    merged = merge_adjacent_chunks([first, second, other_page])
+    assert len(merged) == 2
+    assert merged[0].page_content.endswith("Partie commune du chevauchement ici. Suite du texte.")
+
+
+def test_pack_context_keeps_everything_when_within_budget():
+    documents = [Document(page_content="Boire de l'eau.", metadata={"source": "docs/nutrition.pdf", "page": 3})]
+    context, stats = pack_context("hydratation", documents, max_tokens=100)
+    assert context == "[nutrition.pdf, p. 3]\nBoire de l'eau."
+    assert not stats["truncated"]
+
+
+def test_pack_context_keeps_relevant_sentences_within_budget():
+    filler = " ".join(f"Phrase de remplissage numéro {i} sans rapport." for i in range(40))
+    documents = [
+        Document(page_content=filler, metadata={"source": "a.pdf", "page": 1}),
+        Document(page_content=filler + " Les glucides rechargent le glycogène avant la course.", metadata={"source": "b.pdf", "page": 2}),
+    ]
+    context, stats = pack_context("glucides glycogène", documents, max_tokens=60)
+    assert stats["truncated"]
+    assert estimate_tokens(context) <= 60
+    assert "Les glucides rechargent le glycogène avant la course." in context
+    assert "[b.pdf, p. 2]" in context
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_diversified_retriever_reuses_stored_vectors():
+    embeddings = CountingEmbeddings(size=8)
+    store = NumpyVectorStore(embeddings)
+    store.add_texts([f"chunk numéro {i}" for i in range(6)], ids=[f"c{i}" for i in range(6)])
+    lexical_index = LexicalIndex()
+    lexical_index.add([f"c{i}" for i in range(6)], [f"chunk numéro {i}" for i in range(6)], [{} for _ in range(6)])
+    retriever = DiversifiedRetriever(
+        base_retriever=HybridRetriever(vector_retriever=store.as_retriever(search_kwargs={"k": 6}), lexical_index=lexical_index, k=6, fetch_k=6),
+        vectorstore=store, embeddings=embeddings, k=3
+    )
+    embeddings.calls = 0
+
+    assert len(retriever.invoke("chunk numéro 2")) == 3
+    assert embeddings.calls == 0 # Aucun candidat ré-embeddé
+
+
+def test_diversified_retriever_embeds_only_candidates_without_id():
+    embeddings = CountingEmbeddings(size=8)
+    store = NumpyVectorStore(embeddings)
+    store.add_texts(["a", "b"], ids=["a", "b"])
+    candidates = [Document(page_content="a", id="a"), Document(page_content="inconnu"), Document(page_content="b", id="b")]
+
+    class FixedRetriever(BaseRetriever):
+        def _get_relevant_documents(self, query, *, run_manager):
+            return candidates
+
+    embeddings.calls = 0
+    DiversifiedRetriever(base_retriever=FixedRetriever(), vectorstore=store, embeddings=embeddings, k=2).invoke("q")
+    assert embeddings.calls == 1
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from models import AuthenticatedUser
+
+PDF = b"%PDF-1.4\n" + b"0" * 4000
+
+
+class SubmittedJob:
+    id = "job"
+    status = "pending"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(main, "DOCS_PATH", str(tmp_path))
+    monkeypatch.setattr(main.settings, "UPLOAD_MAX_BYTES", 1000 * 1000)
+    monkeypatch.setattr(main.INDEX_JOBS, "submit", lambda build, files=None: submitted.append(files) or SubmittedJob())
+    main.app.dependency_overrides[main.get_current_user] = lambda: AuthenticatedUser(id=1, email="test@example.com")
+    client = TestClient(main.app)
+    client.submitted = submitted
+    yield client
+    main.app.dependency_overrides.clear()
+
+
+def stream(data: bytes, size: int = 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_upload_writes_file_and_indexes_only_it(client, tmp_path):
+    response = client.post("/documents?filename=plan.pdf", content=stream(PDF))
+    assert response.status_code == 202
+    assert response.json()["size"] == len(PDF)
+    assert (tmp_path / "plan.pdf").read_bytes() == PDF
+    assert client.submitted == [["plan.pdf"]]
+
+
+@pytest.mark.parametrize("filename", ["../plan.pdf", ".cache.pdf", "plan.txt", "dossier/plan.pdf"])
+def test_upload_rejects_invalid_names(client, filename):
+    assert client.post("/documents", params={"filename": filename}, content=PDF).status_code == 400
+    assert client.submitted == []
+
+
+def test_upload_rejects_empty_body(client, tmp_path):
+    assert client.post("/documents?filename=plan.pdf", content=b"").status_code == 400
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_rejects_body_over_limit_while_streaming(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(main.settings, "UPLOAD_MAX_BYTES", 2000)
+    # Sans Content-Length (corps envoyé par morceaux) : la limite est vérifiée pendant la réception
+    response = client.post("/documents?filename=plan.pdf", content=stream(PDF))
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == [] # Ni PDF tronqué ni fichier temporaire
+    assert client.submitted == []
+
+
+def test_upload_rejects_declared_length_over_limit(client, monkeypatch):
+    monkeypatch.setattr(main.settings, "UPLOAD_MAX_BYTES", 2000)
+    assert client.post("/documents?filename=plan.pdf", content=PDF).status_code == 413
+
+
+def test_upload_rejects_non_pdf_content(client, tmp_path):
+    assert client.post("/documents?filename=plan.pdf", content=b"<html></html>").status_code == 415
+    assert os.listdir(tmp_path) == []
+
+
+def test_delete_removes_file_and_unknown_file_is_404(client, tmp_path):
+    (tmp_path / "plan.pdf").write_bytes(PDF)
+    assert client.delete("/documents/plan.pdf").status_code == 202
+    assert not (tmp_path / "plan.pdf").exists()
+    assert client.submitted == [["plan.pdf"]]
+    assert client.delete("/documents/plan.pdf").status_code == 404
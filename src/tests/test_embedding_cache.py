@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding_cache import CachedEmbeddings
+
+
+def make_cache(tmp_path, max_entries=100):
+    return CachedEmbeddings(DeterministicFakeEmbedding(size=4), "fake", str(tmp_path / "cache.sqlite3"), max_entries=max_entries)
+
+
+def test_cached_vectors_are_identical_and_counted(tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.embed_documents(["a", "b", "a"])
+    assert np.allclose(cache.embed_documents(["b", "a"]), [first[1], first[0]], atol=1e-6) # Stockés en float32
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 2, 2)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=20)
+    cache.embed_documents([f"texte {i}" for i in range(20)])
+    cache.embed_documents(["texte 0"]) # Le plus récent : conservé
+    cache.embed_documents([f"nouveau {i}" for i in range(5)])
+
+    stats = cache.stats()
+    assert stats["entries"] <= 20
+    assert stats["evictions"] == 25 - stats["entries"]
+    misses = stats["misses"]
+    cache.embed_documents(["texte 0"])
+    assert cache.stats()["misses"] == misses
+
+
+def test_row_count_survives_reopening(tmp_path):
+    make_cache(tmp_path, max_entries=10).embed_documents([f"texte {i}" for i in range(10)])
+    cache = make_cache(tmp_path, max_entries=10)
+    cache.embed_documents(["autre"])
+    assert cache.stats()["entries"] <= 10
+
+
+def test_counters_are_exact_under_concurrent_calls(tmp_path):
+    cache = make_cache(tmp_path, max_entries=10000)
+    texts = [f"texte {i}" for i in range(50)]
+
+    def work():
+        for _ in range(20):
+            cache.embed_documents(texts)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 4 * 20 * 50
+    assert stats["entries"] == 50
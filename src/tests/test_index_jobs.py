@@ -0,0 +1,72 @@
+import threading
+
+from index_jobs import IndexJobManager
+
+
+def wait_finished(manager, job):
+    for _ in range(200):
+        if job.status in ("succeeded", "failed"):
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job {job.id} toujours {job.status}")
+
+
+def test_status_is_shared_between_workers(tmp_path):
+    state_dir = str(tmp_path / "jobs")
+    writer = IndexJobManager(state_dir=state_dir)
+    other_worker = IndexJobManager(state_dir=state_dir)
+    release = threading.Event()
+
+    def build(job):
+        job.update_progress(3, 10)
+        release.wait(5)
+        return {"added": 1}
+
+    job = writer.submit(build, files=["a.pdf"])
+    assert other_worker.get(job.id) is None
+    assert other_worker.get_status(job.id)["files"] == ["a.pdf"]
+
+    release.set()
+    wait_finished(writer, job)
+    status = other_worker.get_status(job.id)
+    assert status["status"] == "succeeded"
+    assert status["stats"] == {"added": 1}
+
+
+def test_unknown_or_invalid_job_id(tmp_path):
+    manager = IndexJobManager(state_dir=str(tmp_path))
+    assert manager.get_status("0" * 32) is None
+    assert manager.get_status("../../etc/passwd") is None
+
+
+def test_job_fails_when_a_requested_file_was_not_indexed(tmp_path):
+    manager = IndexJobManager(state_dir=str(tmp_path))
+    job = manager.submit(lambda job: {"added": 1, "failed": {"casse.pdf": "EOF marker not found"}}, files=["casse.pdf"])
+    wait_finished(manager, job)
+    assert job.status == "failed"
+    assert "casse.pdf" in job.error
+
+    # Un fichier hors de la demande en échec n'empêche pas le succès du job
+    job = manager.submit(lambda job: {"added": 1, "failed": {"autre.pdf": "EOF marker not found"}}, files=["a.pdf"])
+    wait_finished(manager, job)
+    assert job.status == "succeeded"
+
+
+def test_pending_job_is_shared_only_by_the_same_build(tmp_path):
+    manager = IndexJobManager(state_dir=str(tmp_path))
+    release = threading.Event()
+    running = manager.submit(lambda job: release.wait(5) and {})
+
+    def rebuild(job):
+        return {}
+
+    startup = manager.submit(lambda job: {}) # Ex. : reconstruction seulement si l'index est périmé
+    requested = manager.submit(rebuild, files=["a.pdf"])
+    assert requested is not startup
+    assert manager.submit(rebuild, files=["b.pdf"]) is requested
+    assert requested.files == {"a.pdf", "b.pdf"}
+
+    release.set()
+    for job in (running, startup, requested):
+        wait_finished(manager, job)
+    assert requested.status == "succeeded"
@@ -0,0 +1,20 @@
+import os
+
+import main
+from indexing import publish_version, save_manifest
+
+
+def test_changing_dedup_threshold_makes_published_index_stale(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.pdf").write_bytes(b"%PDF-test")
+    root = str(tmp_path / "index")
+    monkeypatch.setattr(main, "DOCS_PATH", str(docs))
+    monkeypatch.setattr(main, "CHROMA_DB_PATH", root)
+    monkeypatch.setattr(main, "INDEX_VERSION", "v1") # Version déjà servie : rien à ouvrir
+    save_manifest(os.path.join(root, "v1"), {"version": 1, "files": {}, "corpus_fingerprint": main.current_corpus_fingerprint()})
+    publish_version(root, "v1")
+    assert main.load_published_index()
+
+    monkeypatch.setattr(main.settings, "DEDUP_THRESHOLD", main.settings.DEDUP_THRESHOLD - 0.1)
+    assert not main.load_published_index()
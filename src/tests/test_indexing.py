@@ -0,0 +1,181 @@
+import os
+import random
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chunk_dedup import MinHasher, NearDuplicateIndex, stored_chunk_ids
+from embedding_scheduler import EmbeddingScheduler
+import indexing
+from indexing import (
+    cleanup_old_versions, file_sha256, list_versions, load_manifest, publish_version,
+    read_publication_times, sync_vectorstore
+)
+from ingest_cache import IngestCache
+from lexical_index import LexicalIndex
+from vector_index import NumpyVectorStore
+
+CHUNK_SIZE = 200
+
+
+def page_texts(seed: int, pages: int = 3):
+    """Pages de texte pseudo-aléatoire (assez différentes d'un seed à l'autre pour ne pas être dédoublonnées)."""
+    generator = random.Random(seed)
+    words = [f"mot{generator.randrange(5000)}" for _ in range(pages * 60)]
+    return [" ".join(words[i * 60:(i + 1) * 60]) for i in range(pages)]
+
+
+class Corpus:
+    """
+    Dossier docs de test : le texte des pages est déposé dans le cache d'ingestion,
+    les "PDF" ne sont donc jamais ouverts par pypdf (sauf ceux écrits sans texte en cache).
+    """
+
+    def __init__(self, root):
+        self.docs = os.path.join(root, "docs")
+        self.index = os.path.join(root, "index")
+        os.makedirs(self.docs)
+        self.cache = IngestCache(os.path.join(root, "ingest"))
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.vectorstore = NumpyVectorStore(self.embeddings, persist_directory=self.index)
+        self.lexical_index = LexicalIndex()
+
+    def write(self, filename: str, pages, cached: bool = True):
+        path = os.path.join(self.docs, filename)
+        with open(path, "wb") as f:
+            f.write(b"%PDF-test " + "\n".join(pages).encode("utf-8"))
+        if cached:
+            writer = self.cache.pages_writer(file_sha256(path))
+            writer.append([Document(page_content=text, metadata={"page": page}) for page, text in enumerate(pages)])
+            writer.commit()
+
+    def remove(self, filename: str):
+        os.remove(os.path.join(self.docs, filename))
+
+    def sync(self, dedup: bool = True, **kwargs):
+        return sync_vectorstore(
+            self.vectorstore, self.docs, self.index, CHUNK_SIZE,
+            EmbeddingScheduler(self.embeddings, batch_size=8, max_concurrency=2),
+            max_workers=1, ingest_cache=self.cache, lexical_index=self.lexical_index,
+            dedup_index=NearDuplicateIndex(MinHasher(num_perm=64), bands=16) if dedup else None,
+            **kwargs
+        )
+
+    def manifest_files(self):
+        return load_manifest(self.index)["files"]
+
+    def stored_ids(self):
+        return set(self.vectorstore.get(include=[])["ids"])
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return Corpus(str(tmp_path))
+
+
+def test_sync_adds_new_files_and_skips_unchanged(corpus):
+    corpus.write("a.pdf", page_texts(1))
+    corpus.write("b.pdf", page_texts(2))
+
+    stats = corpus.sync()
+    assert (stats["added"], stats["unchanged"]) == (2, 0)
+    ingestion = stats["ingestion"]
+    if ingestion["rss_start_mb"] is not None: # Linux
+        assert ingestion["rss_increase_mb"] == ingestion["rss_peak_mb"] - ingestion["rss_start_mb"] >= 0
+    files = corpus.manifest_files()
+    assert sorted(files) == ["a.pdf", "b.pdf"]
+    expected = {chunk_id for entry in files.values() for chunk_id in stored_chunk_ids(entry)}
+    assert corpus.stored_ids() == expected
+    assert len(corpus.lexical_index) == len(expected)
+
+    stats = corpus.sync()
+    assert (stats["added"], stats["unchanged"], stats["chunks_added"]) == (0, 2, 0)
+
+
+def test_sync_removes_chunks_of_deleted_file(corpus):
+    corpus.write("a.pdf", page_texts(1))
+    corpus.write("b.pdf", page_texts(2))
+    corpus.sync()
+    removed_ids = set(corpus.manifest_files()["a.pdf"]["chunk_ids"])
+
+    corpus.remove("a.pdf")
+    stats = corpus.sync()
+    assert stats["removed"] == 1
+    assert "a.pdf" not in corpus.manifest_files()
+    assert not corpus.stored_ids() & removed_ids
+
+
+def test_sync_only_files_leaves_other_files_alone(corpus):
+    corpus.write("a.pdf", page_texts(1))
+    corpus.sync()
+    corpus.write("b.pdf", page_texts(2))
+    corpus.write("c.pdf", page_texts(3))
+
+    stats = corpus.sync(only_files={"b.pdf"})
+    assert (stats["added"], stats["unchanged"]) == (1, 1)
+    assert sorted(corpus.manifest_files()) == ["a.pdf", "b.pdf"]
+
+
+def test_duplicates_are_not_embedded_and_cascade_on_delete(corpus):
+    pages = page_texts(1)
+    corpus.write("a.pdf", pages)
+    corpus.write("copie.pdf", pages + ["page en plus " * 5])
+    corpus.sync()
+
+    files = corpus.manifest_files()
+    copy_entry = files["copie.pdf"]
+    assert copy_entry["duplicates"]
+    representatives = {representative for representative, _ in copy_entry["duplicates"].values()}
+    assert representatives <= set(files["a.pdf"]["chunk_ids"])
+    assert not corpus.stored_ids() & set(copy_entry["duplicates"])
+
+    # Le fichier d'origine disparaît : la copie est réindexée, ses chunks sont embeddés
+    corpus.remove("a.pdf")
+    stats = corpus.sync()
+    assert (stats["removed"], stats["updated"]) == (1, 1)
+    copy_entry = corpus.manifest_files()["copie.pdf"]
+    assert not copy_entry["duplicates"]
+    assert corpus.stored_ids() == set(copy_entry["chunk_ids"])
+
+
+def test_unreadable_file_is_rolled_back(corpus):
+    corpus.write("a.pdf", page_texts(1))
+    corpus.sync()
+    previous_entry = corpus.manifest_files()["a.pdf"]
+    previous_ids = corpus.stored_ids()
+
+    # Nouveau contenu sans texte en cache : pypdf échoue sur ce faux PDF
+    corpus.write("a.pdf", ["contenu illisible"], cached=False)
+    corpus.write("casse.pdf", ["illisible aussi"], cached=False)
+    corpus.write("b.pdf", page_texts(2))
+    stats = corpus.sync()
+
+    files = corpus.manifest_files()
+    assert files["a.pdf"] == previous_entry # L'ancienne entrée est conservée
+    assert "casse.pdf" not in files
+    assert stats["added"] == 1
+    assert sorted(stats["failed"]) == ["a.pdf", "casse.pdf"]
+    assert corpus.stored_ids() == previous_ids | set(files["b.pdf"]["chunk_ids"])
+
+
+def test_cleanup_keeps_recently_replaced_versions(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    for number in range(1, 5):
+        os.makedirs(os.path.join(root, f"v{number}"))
+    clock = [1000.0]
+    monkeypatch.setattr(indexing.time, "time", lambda: clock[0])
+    publish_version(root, "v1")
+    publish_version(root, "v2")
+    clock[0] = 2000.0
+    publish_version(root, "v3") # Remplace v2 : d'autres workers peuvent encore servir v2
+    publish_version(root, "v4")
+
+    clock[0] = 2010.0
+    cleanup_old_versions(root, keep=2, grace_seconds=60)
+    assert list_versions(root) == ["v2", "v3", "v4"]
+
+    clock[0] = 2100.0
+    cleanup_old_versions(root, keep=2, grace_seconds=60)
+    assert list_versions(root) == ["v3", "v4"]
+    assert sorted(read_publication_times(root)) == ["v3", "v4"]
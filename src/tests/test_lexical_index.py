@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_normalizes_accents_stopwords_and_elisions():
+    assert tokenize("Les séances d'entraînement de l'athlète") == ["seance", "entrainement", "athlete"]
+
+
+def test_tokenize_keeps_numbers_with_units():
+    assert tokenize("Courir 10km à 4:30/km, soit 5h30 par semaine et 60% de VMA") == [
+        "courir", "10km", "4:30/km", "soit", "5h30", "semaine", "60%", "vma"
+    ]
+
+
+def test_tokenize_reads_paces_written_with_apostrophe():
+    assert tokenize("allure 4'30/km") == tokenize("allure 4’30/km") == tokenize("allure 4:30/km")
+
+
+def test_lexical_index_ranks_exact_term_first():
+    index = LexicalIndex()
+    index.add(
+        ["a", "b"],
+        ["Sortie longue en endurance fondamentale", "Fractionné court à l'allure 4:30/km"],
+        [{"id": "a"}, {"id": "b"}]
+    )
+    assert [document.metadata["id"] for document, _ in index.search("4:30/km", k=2)] == ["b"]
+
+
+@pytest.mark.parametrize("glued, spaced", [
+    ("10km", "10 km"),
+    ("4:30/km", "allure 4:30 /km"),
+    ("4:30/km", "4:30 / km"),
+    ("12km/h", "12 km/h"),
+    ("60%", "60 %"),
+    ("5g", "5 g de glucides"),
+])
+def test_tokenize_joins_number_and_unit_regardless_of_spacing(glued, spaced):
+    assert tokenize(glued)[0] in tokenize(spaced)
+
+
+def test_tokenize_does_not_glue_words_starting_like_units():
+    assert tokenize("10 minutes") == ["10", "minute"]
+
+
+def test_exact_term_matches_chunk_spelled_with_spaces():
+    index = LexicalIndex()
+    index.add(["a", "b"], ["Plan pour courir un 10 km", "Sortie longue de 2 heures"], [{"id": "a"}, {"id": "b"}])
+    assert [document.metadata["id"] for document, _ in index.search("10km")] == ["a"]
+
+
+def test_index_saved_with_older_tokenizer_is_retokenized(tmp_path):
+    index = LexicalIndex()
+    index.add(["a"], ["Plan pour courir un 10 km"], [{"id": "a"}])
+    index.save(str(tmp_path))
+    docstore_path = tmp_path / "docstore.json"
+    docstore = json.loads(docstore_path.read_text(encoding="utf-8"))
+    docstore.pop("tokenizer")
+    docstore_path.write_text(json.dumps(docstore), encoding="utf-8")
+
+    reloaded = LexicalIndex.load(str(tmp_path))
+    assert [document.metadata["id"] for document, _ in reloaded.search("10km")] == ["a"]
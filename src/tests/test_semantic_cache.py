@@ -0,0 +1,44 @@
+import semantic_cache
+from semantic_cache import SemanticAnswerCache
+
+
+def test_lookup_returns_answer_of_similar_question():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=4)
+    cache.store("Combien boire ?", [1.0, 0.0], "1,5 L par jour", "v1")
+
+    hit = cache.lookup([0.99, 0.05], "v1")
+    assert hit["answer"] == "1,5 L par jour"
+    assert cache.lookup([0.0, 1.0], "v1") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(max_entries=4, ttl_seconds=60)
+    cache.store("q", [1.0, 0.0], "réponse", "v1")
+
+    now[0] += 59
+    assert cache.lookup([1.0, 0.0], "v1") is not None
+    now[0] += 2
+    assert cache.lookup([1.0, 0.0], "v1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_index_version_invalidates_cache():
+    cache = SemanticAnswerCache(max_entries=4)
+    cache.store("q", [1.0, 0.0], "réponse", "v1")
+
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    assert cache.lookup([1.0, 0.0], "v1") is None # L'ancienne version ne revient pas
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], "A", "v1")
+    cache.store("b", [0.0, 1.0, 0.0], "B", "v1")
+    cache.lookup([1.0, 0.0, 0.0], "v1") # "a" devient le plus récent
+    cache.store("c", [0.0, 0.0, 1.0], "C", "v1")
+
+    assert cache.lookup([1.0, 0.0, 0.0], "v1")["answer"] == "A"
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
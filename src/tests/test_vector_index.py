@@ -0,0 +1,54 @@
+import threading
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_index import NumpyVectorStore
+
+
+def make_store(directory=None):
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=3), persist_directory=directory)
+    store.upsert_embeddings(
+        ["a", "b", "c"], ["texte a", "texte b", "texte c"], [{"page": 0}, {"page": 1}, {"page": 2}],
+        [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0]]
+    )
+    return store
+
+
+def test_search_ranks_by_cosine_and_skips_deleted_rows():
+    store = make_store()
+    assert [document.id for document, _ in store.similarity_search_by_vector_with_score([1.0, 0.1, 0.0], k=2)] == ["a", "c"]
+    store.delete(ids=["a"])
+    assert [document.id for document, _ in store.similarity_search_by_vector_with_score([1.0, 0.1, 0.0], k=3)] == ["c", "b"]
+
+
+def test_saved_store_is_reloaded_compacted(tmp_path):
+    store = make_store(str(tmp_path))
+    store.delete(ids=["b"])
+    store.save()
+    reloaded = NumpyVectorStore(DeterministicFakeEmbedding(size=3), persist_directory=str(tmp_path))
+    assert reloaded.get(include=[])["ids"] == ["a", "c"]
+    assert reloaded.similarity_search_by_vector([0.0, 1.0, 0.0], k=1)[0].page_content == "texte c"
+
+
+def test_concurrent_searches_and_writes():
+    store = make_store()
+    errors = []
+
+    def search():
+        try:
+            for _ in range(200):
+                results = store.similarity_search_by_vectors(np.eye(3), k=2)
+                assert all(len(result) == 2 for result in results)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(200):
+        store.upsert_embeddings([f"x{i}"], [f"x {i}"], [{}], [[0.0, 0.0, 1.0]])
+        store.delete(ids=[f"x{i}"])
+    for thread in threads:
+        thread.join()
+    assert not errors
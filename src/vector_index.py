@@ -0,0 +1,236 @@
+# src/vector_index.py
+# Index vectoriel en mémoire (NumPy), alternative à Chroma pour un corpus de notre taille.
+# Les embeddings sont stockés normalisés dans une matrice float32 mappée en mémoire :
+# le top-k est un seul produit matriciel suivi d'un argpartition, sans passer par les
+# couches client/SQLite de Chroma. Textes et métadonnées sont rangés à part
+# (un blob UTF-8 + tableau d'offsets, et un JSON pour les ids/métadonnées).
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILENAME = "vectors.npy"
+TEXTS_FILENAME = "texts.bin"
+OFFSETS_FILENAME = "text_offsets.npy"
+METADATA_FILENAME = "docstore.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalise chaque ligne (norme L2) pour que le produit scalaire soit la similarité cosinus."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store persistant basé sur une matrice NumPy.
+    Les écritures (upsert/delete) sont faites en mémoire puis écrites par save().
+    """
+
+    def __init__(self, embedding_function: Embeddings, persist_directory: Optional[str] = None):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self._lock = threading.RLock()
+
+        self._vectors: Optional[np.ndarray] = None # (n, dim) float32, normalisée
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_by_id: Dict[str, int] = {}
+        # Ajouts en attente, regroupés en une seule concaténation avant la prochaine recherche
+        self._pending: List[np.ndarray] = []
+
+        if persist_directory and os.path.exists(os.path.join(persist_directory, VECTORS_FILENAME)):
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    # --- Persistance ---
+
+    def _load(self):
+        directory = self.persist_directory
+        self._vectors = np.load(os.path.join(directory, VECTORS_FILENAME), mmap_mode="r")
+        with open(os.path.join(directory, METADATA_FILENAME), "r", encoding="utf-8") as f:
+            docstore = json.load(f)
+        self._ids = docstore["ids"]
+        self._metadatas = docstore["metadatas"]
+        offsets = np.load(os.path.join(directory, OFFSETS_FILENAME))
+        with open(os.path.join(directory, TEXTS_FILENAME), "rb") as f:
+            blob = f.read()
+        self._texts = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self._ids))]
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+    def save(self):
+        """Compacte l'index (retire les lignes supprimées) et l'écrit sur disque de manière atomique."""
+        if not self.persist_directory:
+            return
+        with self._lock:
+            self._consolidate()
+            keep = np.flatnonzero(self._alive)
+            vectors = np.ascontiguousarray(self._vectors[keep]) if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._vectors = vectors
+            self._alive = np.ones(len(self._ids), dtype=bool)
+            self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+            encoded = [text.encode("utf-8") for text in self._texts]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+            os.makedirs(self.persist_directory, exist_ok=True)
+            self._write_atomic(VECTORS_FILENAME, lambda f: np.save(f, vectors))
+            self._write_atomic(OFFSETS_FILENAME, lambda f: np.save(f, offsets))
+            self._write_atomic(TEXTS_FILENAME, lambda f: f.write(b"".join(encoded)))
+            self._write_atomic(
+                METADATA_FILENAME,
+                lambda f: f.write(json.dumps({"ids": self._ids, "metadatas": self._metadatas}, ensure_ascii=False).encode("utf-8")),
+            )
+
+    def _write_atomic(self, filename: str, write):
+        path = os.path.join(self.persist_directory, filename)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    # --- Écritures ---
+
+    def _consolidate(self):
+        """Ajoute à la matrice les vecteurs en attente (appelé sous verrou)."""
+        if not self._pending:
+            return
+        blocks = ([np.asarray(self._vectors)] if self._vectors is not None and len(self._vectors) else []) + self._pending
+        self._vectors = np.vstack(blocks)
+        self._pending = []
+
+    def upsert_embeddings(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict],
+                          vectors: Sequence[Sequence[float]]):
+        """Ajoute ou remplace des chunks dont les embeddings sont déjà calculés."""
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            self.delete(ids=[chunk_id for chunk_id in ids if chunk_id in self._row_by_id])
+            start = len(self._ids)
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(metadata or {}) for metadata in metadatas)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for offset, chunk_id in enumerate(ids):
+                self._row_by_id[chunk_id] = start + offset
+            self._pending.append(matrix)
+
+    def update_metadatas(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        """Complète les métadonnées de chunks existants (les clés données remplacent les anciennes)."""
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self._row_by_id.get(chunk_id)
+                if row is not None:
+                    self._metadatas[row] = {**self._metadatas[row], **metadata}
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if ids is None:
+            ids = [f"chunk-{len(self._ids) + i}" for i in range(len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        self.upsert_embeddings(ids, texts, metadatas, self.embedding_function.embed_documents(texts))
+        return list(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return True
+        with self._lock:
+            for chunk_id in ids:
+                row = self._row_by_id.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = False
+        return True
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, List]:
+        """Liste les chunks présents (même forme de retour que Chroma.get pour les ids)."""
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            result = {"ids": [self._ids[row] for row in rows]}
+            if include is None or "documents" in include:
+                result["documents"] = [self._texts[row] for row in rows]
+            if include is None or "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+        return result
+
+    def get_vectors(self, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Embeddings (normalisés) des chunks demandés ; les ids inconnus sont absents du résultat."""
+        with self._lock:
+            self._consolidate()
+            rows = {chunk_id: self._row_by_id[chunk_id] for chunk_id in ids if chunk_id in self._row_by_id}
+            vectors = self._vectors
+        return {chunk_id: np.asarray(vectors[row]) for chunk_id, row in rows.items()}
+
+    def count(self) -> int:
+        return int(self._alive.sum())
+
+    # --- Recherche ---
+
+    def similarity_search_by_vectors(self, query_vectors: Sequence[Sequence[float]], k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Top-k pour un lot de requêtes : un produit matriciel (q, n) puis argpartition par ligne."""
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        # Photographie sous verrou, calcul hors verrou : les requêtes concurrentes ne sont pas sérialisées.
+        # Les écritures remplacent la matrice et les listes (ou les prolongent) sans modifier les lignes
+        # existantes ; seul _alive est modifié sur place, d'où la copie.
+        with self._lock:
+            self._consolidate()
+            vectors, alive = self._vectors, self._alive.copy()
+            ids, texts, metadatas = self._ids, self._texts, self._metadatas
+        if vectors is None or not alive.any():
+            return [[] for _ in range(len(queries))]
+        scores = queries @ vectors.T
+        if not alive.all():
+            scores[:, ~alive] = -np.inf
+        k = min(k, int(alive.sum()))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_index, rows in enumerate(top):
+            rows = rows[np.argsort(-scores[query_index, rows])]
+            results.append([
+                (
+                    Document(page_content=texts[row], metadata=dict(metadatas[row]), id=ids[row]),
+                    float(scores[query_index, row]),
+                )
+                for row in rows
+            ])
+        return results
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors([embedding], k=k)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def _select_relevance_score_fn(self):
+        # Les scores sont déjà des similarités cosinus ([-1, 1]) : ramenées à [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: Optional[str] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, persist_directory=persist_directory)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.save()
+        return store